@@ -0,0 +1,250 @@
+"""
+📊 סיכומים יומיים מצטברים לכל משתמש
+"""
+
+from collections import deque
+from datetime import datetime
+
+from history import DAY, day_number, to_micros
+
+CALORIE_TOLERANCE = 0.1
+TREND_WINDOW = 7
+
+class DayBucket:
+    __slots__ = ("calories", "protein", "workout_minutes", "meal_count", "workout_count")
+
+    def __init__(self):
+        self.calories = 0
+        self.protein = 0
+        self.workout_minutes = 0
+        self.meal_count = 0
+        self.workout_count = 0
+
+EMPTY_DAY = DayBucket()
+
+class DayView:
+    __slots__ = ("calories", "protein", "workout_minutes", "meals", "workouts")
+
+class Window:
+    __slots__ = ("calories", "protein", "workout_minutes", "meal_count", "workout_count",
+                 "meal_days", "workout_days", "weights")
+
+    def __init__(self):
+        self.calories = 0
+        self.protein = 0
+        self.workout_minutes = 0
+        self.meal_count = 0
+        self.workout_count = 0
+        self.meal_days = 0
+        self.workout_days = 0
+        self.weights = []
+
+class Report(Window):
+    """Whole-day totals for ``first``..``last`` plus target adherence and per-type workouts.
+
+    ``weights`` holds ``(day, value)`` pairs with the last weigh-in of each day
+    and ``trend`` their trailing moving average, warmed up on the days before
+    ``first``.
+    """
+
+    __slots__ = ("first", "last", "days", "calorie_days", "protein_days", "workout_types", "trend")
+
+    def __init__(self, first, last):
+        super().__init__()
+        self.first = first
+        self.last = last
+        self.days = (last - first).days + 1
+        self.calorie_days = 0
+        self.protein_days = 0
+        self.workout_types = {}
+        self.trend = []
+
+def moving_average(weights, window=TREND_WINDOW):
+    """Trailing ``window``-day mean for each ``(day, value)`` pair, skipping days without a weigh-in."""
+    recent = deque()
+    total = 0.0
+    averages = []
+    for day, value in weights:
+        recent.append((day, value))
+        total += value
+        while recent[0][0] <= day - window:
+            total -= recent.popleft()[1]
+        averages.append((day, total / len(recent)))
+    return averages
+
+class UserAggregates:
+    """Per-day calorie/protein/workout buckets over a user's columnar logs.
+
+    Buckets are updated as records are appended; record lists and the partial
+    first day of a rolling window are read straight from the logs by bisecting
+    their sorted timestamps. Compacted days only exist as summaries, which
+    count towards the buckets like the raw records they replaced.
+    """
+
+    def __init__(self, history):
+        self.history = history
+        self.days = {}
+
+    @classmethod
+    def from_history(cls, history):
+        aggregates = cls(history)
+        meals, workouts = history["meals"], history["workouts"]
+        for micros, calories, protein in zip(meals.timestamps, meals.column("calories"), meals.column("protein")):
+            aggregates._add_meal(micros // DAY, calories, protein)
+        for micros, duration in zip(workouts.timestamps, workouts.column("duration")):
+            aggregates._add_workout(micros // DAY, duration)
+        days = history["days"]
+        columns = (days.column(field) for field in ("calories", "protein", "meal_count", "workout_minutes", "workout_count"))
+        for micros, calories, protein, meal_count, workout_minutes, workout_count in zip(days.timestamps, *columns):
+            bucket = aggregates._bucket(micros // DAY)
+            bucket.calories += calories
+            bucket.protein += protein
+            bucket.meal_count += meal_count
+            bucket.workout_minutes += workout_minutes
+            bucket.workout_count += workout_count
+        return aggregates
+
+    def _bucket(self, day):
+        bucket = self.days.get(day)
+        if bucket is None:
+            bucket = self.days[day] = DayBucket()
+        return bucket
+
+    def _add_meal(self, day, calories, protein):
+        bucket = self._bucket(day)
+        bucket.calories += calories
+        bucket.protein += protein
+        bucket.meal_count += 1
+
+    def _add_workout(self, day, duration):
+        bucket = self._bucket(day)
+        bucket.workout_minutes += duration
+        bucket.workout_count += 1
+
+    def add(self, kind, micros, record):
+        if kind == "meals":
+            self._add_meal(micros // DAY, record["calories"], record.get("protein", 0))
+        elif kind == "workouts":
+            self._add_workout(micros // DAY, record["duration"])
+
+    def day(self, date):
+        bucket = self.days.get(day_number(date), EMPTY_DAY)
+        start = day_number(date) * DAY
+        day = DayView()
+        day.calories = bucket.calories
+        day.protein = bucket.protein
+        day.workout_minutes = bucket.workout_minutes
+        meals, workouts = self.history["meals"], self.history["workouts"]
+        day.meals = [meals[i] for i in meals.span(start - 1, start + DAY)]
+        day.workouts = [workouts[i] for i in workouts.span(start - 1, start + DAY)]
+        return day
+
+    def since(self, start, end=None):
+        """Totals for records strictly after ``start``, up to the end of ``end``'s day."""
+        end = end or datetime.now()
+        window = Window()
+        meals, workouts, weights = self.history["meals"], self.history["workouts"], self.history["weights"]
+        start_micros = to_micros(start)
+        first_day = start_micros // DAY
+        boundary = (first_day + 1) * DAY
+
+        partial = meals.span(start_micros, boundary)
+        window.calories = sum(meals.column("calories")[partial.start:partial.stop])
+        window.protein = sum(meals.column("protein")[partial.start:partial.stop])
+        window.meal_count = len(partial)
+        partial = workouts.span(start_micros, boundary)
+        window.workout_minutes = sum(workouts.column("duration")[partial.start:partial.stop])
+        window.workout_count = len(partial)
+        window.meal_days = 1 if window.meal_count else 0
+        window.workout_days = 1 if partial else 0
+
+        for day in range(first_day + 1, day_number(end.date()) + 1):
+            bucket = self.days.get(day)
+            if bucket is not None:
+                window.calories += bucket.calories
+                window.protein += bucket.protein
+                window.workout_minutes += bucket.workout_minutes
+                window.meal_count += bucket.meal_count
+                window.workout_count += bucket.workout_count
+                if bucket.meal_count:
+                    window.meal_days += 1
+                if bucket.workout_count:
+                    window.workout_days += 1
+
+        window.weights = [weights[i] for i in weights.span(start_micros, (day_number(end.date()) + 1) * DAY)]
+        return window
+
+    def _buckets(self, lo, hi):
+        """``(day, bucket)`` for the days ``lo``..``hi`` that have data, walking the range or the buckets, whichever is shorter."""
+        days = self.days
+        if hi - lo + 1 <= len(days):
+            for day in range(lo, hi + 1):
+                bucket = days.get(day)
+                if bucket is not None:
+                    yield day, bucket
+        else:
+            for day in sorted(day for day in days if lo <= day <= hi):
+                yield day, days[day]
+
+    def needs_archive(self, first):
+        """Whether the whole days from ``first`` on include compacted days, whose workouts are only in the archive."""
+        days = self.history["days"]
+        return bool(days) and days.timestamps[-1] >= day_number(first) * DAY
+
+    def report(self, first, last, target_calories=0, target_protein=0, archived=None):
+        """Totals for the whole days ``first``..``last``, answered from the day buckets and column slices.
+
+        ``archived`` holds raw logs loaded from the archive for compacted days, used for the workout types.
+        """
+        report = Report(first, last)
+        lo, hi = day_number(first), day_number(last)
+        low_calories = target_calories * (1 - CALORIE_TOLERANCE)
+        high_calories = target_calories * (1 + CALORIE_TOLERANCE)
+        for day, bucket in self._buckets(lo, hi):
+            report.calories += bucket.calories
+            report.protein += bucket.protein
+            report.workout_minutes += bucket.workout_minutes
+            report.meal_count += bucket.meal_count
+            report.workout_count += bucket.workout_count
+            if bucket.meal_count:
+                report.meal_days += 1
+                if target_calories and low_calories <= bucket.calories <= high_calories:
+                    report.calorie_days += 1
+                if target_protein and bucket.protein >= target_protein:
+                    report.protein_days += 1
+            if bucket.workout_count:
+                report.workout_days += 1
+
+        start, end = lo * DAY - 1, (hi + 1) * DAY
+        types = report.workout_types
+        for workouts in (archived["workouts"], self.history["workouts"]) if archived else (self.history["workouts"],):
+            span = workouts.span(start, end)
+            for kind, duration in zip(workouts.column("type")[span.start:span.stop],
+                                      workouts.column("duration")[span.start:span.stop]):
+                totals = types.get(kind)
+                if totals is None:
+                    totals = types[kind] = [0, 0]
+                totals[0] += 1
+                totals[1] += duration
+        report.weights = self.daily_weights(start, end)
+        warmup = self.daily_weights(start - (TREND_WINDOW - 1) * DAY, start + 1)
+        report.trend = moving_average(warmup + report.weights)[len(warmup):]
+        return report
+
+    def daily_weights(self, start=None, end=None):
+        """Last weigh-in of each day with ``start < timestamp < end``, as ``(day, value)`` pairs.
+
+        Compacted days contribute their summary's weight; a raw weigh-in on the same day wins.
+        """
+        daily = {}
+        days = self.history["days"]
+        span = days.span(start, end)
+        for micros, value in zip(days.timestamps[span.start:span.stop], days.column("weight")[span.start:span.stop]):
+            if value:
+                daily[micros // DAY] = value
+        summarized = len(daily)
+        weights = self.history["weights"]
+        span = weights.span(start, end)
+        for micros, value in zip(weights.timestamps[span.start:span.stop], weights.column("value")[span.start:span.stop]):
+            daily[micros // DAY] = value
+        return sorted(daily.items()) if summarized else list(daily.items())
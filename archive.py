@@ -0,0 +1,238 @@
+"""
+🗄️ דחיסת היסטוריה ישנה לסיכומים יומיים וארכיון דחוס
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from foods import FoodCatalog
+from history import DAY, LOGS, RAW_KINDS, day_number, from_micros
+from storage import atomic_write, open_storage
+
+MIN_HORIZON_DAYS = 8
+
+def _size(record):
+    return len(json.dumps(record, ensure_ascii=False).encode())
+
+def _new_day(day):
+    return {
+        "calories": 0, "protein": 0, "meal_count": 0, "workout_minutes": 0, "workout_count": 0,
+        "weight": 0.0, "date": from_micros(day * DAY).isoformat(),
+    }
+
+class Plan:
+    """What compacting one user moves: raw record counts per kind, the day summaries replacing them and the segment holding them."""
+
+    __slots__ = ("cutoff", "counts", "days", "payload", "segment", "raw_bytes", "summary_bytes")
+
+    @property
+    def records(self):
+        return sum(self.counts.values())
+
+def plan_compaction(history, cutoff):
+    """Plan rolling the records dated before ``cutoff`` into day summaries, or None if there are none."""
+    cutoff_micros = day_number(cutoff) * DAY
+    counts = {kind: bisect_left(history[kind].timestamps, cutoff_micros) for kind in RAW_KINDS}
+    if not any(counts.values()):
+        return None
+    existing = {record.date: record.to_dict() for record in history["days"]}
+    summaries = {}
+
+    def summary(micros):
+        day = micros // DAY
+        record = summaries.get(day)
+        if record is None:
+            record = _new_day(day)
+            record = summaries[day] = existing.get(record["date"], record)
+        return record
+
+    meals, workouts, weights = (history[kind] for kind in RAW_KINDS)
+    foods = FoodCatalog()
+    count = counts["meals"]
+    columns = (meals.column(field)[:count] for field in ("name", "calories", "protein"))
+    for micros, name, calories, protein in zip(meals.timestamps[:count], *columns):
+        record = summary(micros)
+        record["calories"] += calories
+        record["protein"] += protein
+        record["meal_count"] += 1
+        foods.add(name, calories, protein, micros, index=False)
+    count = counts["workouts"]
+    for micros, duration in zip(workouts.timestamps[:count], workouts.column("duration")[:count]):
+        record = summary(micros)
+        record["workout_minutes"] += duration
+        record["workout_count"] += 1
+    count = counts["weights"]
+    for micros, value in zip(weights.timestamps[:count], weights.column("value")[:count]):
+        summary(micros)["weight"] = value
+
+    records = [(kind, history[kind][i].to_dict()) for kind in RAW_KINDS for i in range(counts[kind])]
+    stamps = [history[kind].timestamps[i] for kind in RAW_KINDS if counts[kind] for i in (0, counts[kind] - 1)]
+    plan = Plan()
+    plan.cutoff = cutoff.isoformat()
+    plan.counts = counts
+    plan.days = sorted(summaries.values(), key=lambda record: record["date"])
+    plan.payload = gzip.compress(
+        "".join(json.dumps([kind, record], ensure_ascii=False) + "\n" for kind, record in records).encode()
+    )
+    plan.segment = {
+        "segment": f"{len(history['archive']):05d}",
+        "first": from_micros(min(stamps)).date().isoformat(),
+        "last": from_micros(max(stamps)).date().isoformat(),
+        "records": len(records),
+        "bytes": len(plan.payload),
+        "foods": [[food.name, food.calories, food.protein, food.count, food.last] for food in foods.foods.values()],
+    }
+    plan.raw_bytes = sum(_size(record) for _, record in records)
+    plan.summary_bytes = _size(plan.segment) + sum(
+        _size(record) for record in plan.days if record["date"] not in existing
+    )
+    return plan
+
+def apply_compaction(history, plan):
+    """Apply ``plan`` to the in-memory history; the per-day totals it yields stay the same."""
+    for kind, count in plan.counts.items():
+        history[kind].drop(count)
+    days = {record.date: record.to_dict() for record in history["days"]}
+    days.update((record["date"], record) for record in plan.days)
+    history["days"] = LOGS["days"].from_dicts(days.values())
+    history["archive"].append(plan.segment)
+
+class ArchiveStore:
+    """Gzipped JSONL segments of archived raw records, one directory per user.
+
+    A segment is written before the compaction that references it is queued,
+    and is only listed in the user's record once that compaction is stored, so
+    a crash in between leaves an unlisted file the next run overwrites.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, user_id, segment):
+        return os.path.join(self.directory, str(user_id), f"{segment}.jsonl.gz")
+
+    def write(self, user_id, segment, payload):
+        path = self.path(user_id, segment)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, lambda f: f.write(payload), binary=True)
+
+    def read(self, user_id, segment, kinds=RAW_KINDS):
+        """Yield ``(kind, record)`` pairs, decoding only lines of the requested ``kinds``."""
+        prefixes = tuple(f'["{kind}"' for kind in kinds)
+        with gzip.open(self.path(user_id, segment), 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith(prefixes):
+                    kind, record = json.loads(line)
+                    yield kind, record
+
+class CompactionReport:
+    __slots__ = ("cutoff", "dry_run", "users", "records", "days", "raw_bytes", "summary_bytes", "archive_bytes")
+
+    def __init__(self, cutoff, dry_run):
+        self.cutoff = cutoff
+        self.dry_run = dry_run
+        self.users = 0
+        self.records = 0
+        self.days = 0
+        self.raw_bytes = 0
+        self.summary_bytes = 0
+        self.archive_bytes = 0
+
+    @property
+    def reclaimed(self):
+        return self.raw_bytes - self.summary_bytes
+
+    def add(self, plan):
+        self.users += 1
+        self.records += plan.records
+        self.days += len(plan.days)
+        self.raw_bytes += plan.raw_bytes
+        self.summary_bytes += plan.summary_bytes
+        self.archive_bytes += plan.segment["bytes"]
+
+    def format(self):
+        title = "🔍 הרצת ניסיון" if self.dry_run else "🗄️ דחיסה"
+        return (
+            f"{title} עד {self.cutoff:%d/%m/%Y}: {self.users} משתמשים, "
+            f"{self.records:,} רשומות ל-{self.days:,} סיכומים יומיים\n"
+            f"💾 מתפנים {self.reclaimed:,} בתים ({self.raw_bytes:,} → {self.summary_bytes:,}), "
+            f"ארכיון דחוס {self.archive_bytes:,} בתים"
+        )
+
+class Compactor:
+    """Compacts every user's records older than ``horizon_days`` into day summaries.
+
+    Only users with records before the cutoff are loaded, one at a time under
+    their write lock. The raw records go to an ``ArchiveStore`` segment and the
+    summaries replace them in the store through the cache's write queue, so
+    every summary over whole days returns the same numbers afterwards.
+    """
+
+    def __init__(self, store, horizon_days, clock=datetime.now):
+        if horizon_days < MIN_HORIZON_DAYS:
+            raise ValueError(f"horizon must be at least {MIN_HORIZON_DAYS} days")
+        self.store = store
+        self.horizon_days = horizon_days
+        self.clock = clock
+        self.runs = 0
+        self.users = 0
+        self.records = 0
+        self.reclaimed = 0
+
+    def cutoff(self):
+        return self.clock().date() - timedelta(days=self.horizon_days)
+
+    async def run(self, dry_run=False):
+        cutoff = self.cutoff()
+        report = CompactionReport(cutoff, dry_run)
+        for user_id in await self.store.user_ids_before(cutoff.isoformat()):
+            async with self.store.lock(user_id):
+                plan = await self.store.compact(user_id, cutoff, dry_run)
+            if plan is not None:
+                report.add(plan)
+        if not dry_run:
+            self.runs += 1
+            self.users += report.users
+            self.records += report.records
+            self.reclaimed += report.reclaimed
+        return report
+
+    async def tick(self, context=None):
+        """JobQueue callback."""
+        try:
+            print((await self.run()).format())
+        except Exception as e:
+            print(f"⚠️ שגיאה בדחיסת היסטוריה: {e}")
+
+    def stats(self):
+        return {
+            "compaction_runs": self.runs,
+            "compacted_users": self.users,
+            "compacted_records": self.records,
+            "compacted_bytes": self.reclaimed,
+        }
+
+async def _main(args):
+    from cache import AsyncUserStore, UserCache
+
+    cache = UserCache(open_storage(args.backend, args.path), archive=ArchiveStore(args.archive_dir))
+    store = AsyncUserStore(cache)
+    try:
+        report = await Compactor(store, args.days).run(dry_run=args.dry_run)
+    finally:
+        await store.close()
+    print(report.format())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="דחיסת היסטוריה ישנה לסיכומים יומיים (בלי --dry-run - כשהבוט כבוי)")
+    parser.add_argument("path", help="fitness_data.db או fitness_data.json")
+    parser.add_argument("--backend", default="sqlite", choices=("sqlite", "json"))
+    parser.add_argument("--days", type=int, default=365, help="ימים אחרונים שנשארים מלאים")
+    parser.add_argument("--archive-dir", default="fitness_archive")
+    parser.add_argument("--dry-run", action="store_true", help="רק דוח, בלי לשנות דבר")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,319 @@
+"""
+🧪 מדידת ביצועים אופליין ל-handlers של הבוט
+
+python bench.py --backend sqlite --users 200 --entries 2000 --rounds 3
+python bench.py --dispatch 100000
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import BaseRequest
+
+import bot
+from archive import Compactor
+from metrics import latency_stats
+from persistence import StorePersistence
+from ratelimit import OutboundLimiter
+from scheduler import PerUserUpdateProcessor
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+
+class FakeRequest(BaseRequest):
+    """Answers Bot API calls locally, so handlers run end to end without network access."""
+
+    def __init__(self):
+        self.calls = 0
+        self.message_ids = itertools.count(1000)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        self.calls += 1
+        name = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if name == "getMe":
+            result = BOT_USER
+        elif name in ("sendMessage", "editMessageText"):
+            result = {
+                "message_id": next(self.message_ids), "date": 0,
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "text": params.get("text", "")
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+class Updates:
+    def __init__(self, app):
+        self.app = app
+        self.ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+
+    def _message(self, user_id, text):
+        message = {
+            "message_id": next(self.ids), "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id), "text": text
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return message
+
+    def text(self, user_id, text):
+        return Update.de_json({"update_id": next(self.ids), "message": self._message(user_id, text)}, self.app.bot)
+
+    def callback(self, user_id, data):
+        return Update.de_json({
+            "update_id": next(self.ids),
+            "callback_query": {
+                "id": str(next(self.ids)), "from": self._user(user_id), "chat_instance": str(user_id),
+                "data": data, "message": self._message(user_id, "menu")
+            }
+        }, self.app.bot)
+
+SCENARIOS = {
+    "handle_text": lambda u, uid: [
+        u.text(uid, "ארוחה: טוסט, 300, 12"),
+        u.text(uid, "אימון: ריצה, 30"),
+        u.text(uid, "משקל: 80.5"),
+    ],
+    "quick_meal": lambda u, uid: [u.text(uid, "/meal"), u.callback(uid, "quick_meal_סלט עוף_450_40")],
+    "meal_flow": lambda u, uid: [u.text(uid, "/meal"), u.text(uid, "פסטה"), u.text(uid, "700"), u.text(uid, "25")],
+    "workout_flow": lambda u, uid: [u.text(uid, "/workout"), u.callback(uid, "workout_ריצה"), u.text(uid, "40")],
+    "weight_flow": lambda u, uid: [u.text(uid, "/weight"), u.text(uid, "79.5")],
+    "today_summary": lambda u, uid: [u.text(uid, "/today")],
+    "week_summary": lambda u, uid: [u.text(uid, "/week")],
+    "month_summary": lambda u, uid: [u.text(uid, "/month")],
+    "trend_summary": lambda u, uid: [u.text(uid, "/trend 52")],
+    "report_command": lambda u, uid: [u.text(uid, "/report 3650")],
+}
+
+DISPATCH_MESSAGES = {
+    "meal_shortcut": "ארוחה: טוסט, 300, 12",
+    "workout_shortcut": "התאמנתי: ריצה, 30",
+    "weight_shortcut": "משקל: 80.5",
+    "menu_button": bot.TEXTS.buttons["today"],
+    "flow_button": bot.TEXTS.buttons["meal"],
+    "unmatched": "סתם הודעה",
+}
+
+def seed_history(backend, users, entries, days):
+    now = datetime.now()
+    ops = []
+    for user_id in range(1, users + 1):
+        user_data = {"meals": [], "workouts": [], "weights": [], "settings": {"target_calories": 2000, "target_protein": 150}}
+        for i in range(entries):
+            date = (now - timedelta(days=days * (entries - i) / entries)).isoformat()
+            kind = random.choices(("meals", "workouts", "weights"), (6, 2, 1))[0]
+            if kind == "meals":
+                record = {"name": random.choice(("בוקר", "סלט עוף", "פסטה", "שייק חלבון")),
+                          "calories": random.randint(150, 900), "protein": random.randint(0, 50)}
+            elif kind == "workouts":
+                record = {"type": random.choice(("ריצה", "יוגה", "חדר כושר")), "duration": random.randint(10, 90)}
+            else:
+                record = {"value": round(random.uniform(60, 95), 1)}
+            record["date"] = date
+            user_data[kind].append(record)
+        ops.append(("user", user_id, user_data))
+    backend.write_batch(ops)
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+    }
+
+def build_app(store, request, rate_limit=False):
+    builder = (
+        Application.builder()
+        .token("0:bench")
+        .request(request)
+        .get_updates_request(FakeRequest())
+        .updater(None)
+        .persistence(StorePersistence(store))
+    )
+    if rate_limit:
+        builder = builder.rate_limiter(OutboundLimiter())
+    app = builder.build()
+    bot.add_handlers(app)
+    return app
+
+def select_handler(app, update):
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            check = handler.check_update(update)
+            if check is not None and check is not False:
+                return handler
+    return None
+
+def per_call_ns(fn, arg, iterations):
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn(arg)
+    return round((time.perf_counter_ns() - started) / iterations, 1)
+
+async def run_dispatch(args):
+    """Time handler selection (every ``check_update`` PTB runs) and the text router per message."""
+    os.chdir(tempfile.mkdtemp(prefix="fitness-bench-"))
+    store = bot.init_storage(args.backend)
+    app = build_app(store, FakeRequest())
+    await app.initialize()
+    updates = Updates(app)
+    result = {}
+    for name, text in DISPATCH_MESSAGES.items():
+        update = updates.text(1, text)
+        result[name] = {
+            "handler_ns": per_call_ns(lambda u: select_handler(app, u), update, args.dispatch),
+            "router_ns": per_call_ns(bot.TEXT_ROUTER.match, text, args.dispatch),
+        }
+    await app.shutdown()
+    await bot.storage.close()
+    return {"iterations": args.dispatch, "messages": result}
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="fitness-bench-")
+    os.chdir(workdir)
+    random.seed(args.seed)
+    store = bot.init_storage(args.backend)
+    seed_history(store.cache.backend, args.users, args.entries, args.days)
+    compaction = None
+    if args.compact:
+        compaction = (await Compactor(store, args.compact).run()).format()
+        await store.close()
+        store = bot.init_storage(args.backend)
+
+    request = FakeRequest()
+    app = build_app(store, request, args.rate_limit)
+    await app.initialize()
+    processor = PerUserUpdateProcessor(args.concurrency)
+    updates = Updates(app)
+    samples = {name: [] for name in SCENARIOS}
+    flush_times = []
+
+    async def timed(name, update):
+        started = time.perf_counter()
+        await processor.process_update(update, app.process_update(update))
+        samples[name].append(time.perf_counter() - started)
+
+    async def user_round(user_id):
+        for name, scenario in SCENARIOS.items():
+            for update in scenario(updates, user_id):
+                await timed(name, update)
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        users = list(range(1, args.users + 1))
+        random.shuffle(users)
+        if args.concurrency > 1:
+            await asyncio.gather(*(user_round(user_id) for user_id in users))
+        else:
+            for user_id in users:
+                await user_round(user_id)
+        flush_started = time.perf_counter()
+        await bot.storage.flush()
+        flush_times.append(time.perf_counter() - flush_started)
+    elapsed = time.perf_counter() - started
+    await app.shutdown()
+    await bot.storage.close()
+
+    total = list(itertools.chain.from_iterable(samples.values()))
+    data_file = bot.DB_FILE if args.backend == "sqlite" else bot.DATA_FILE
+    return {
+        "backend": args.backend,
+        "users": args.users,
+        "entries": args.entries,
+        "rounds": args.rounds,
+        "concurrency": args.concurrency,
+        "updates": len(total),
+        "updates_per_sec": round(len(total) / elapsed, 1),
+        "total": summarize(total),
+        "scenarios": {name: summarize(s) for name, s in samples.items()},
+        "flush_ms": round(sum(flush_times) / len(flush_times) * 1000, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "data_file_mb": round(os.path.getsize(os.path.join(workdir, data_file)) / 2**20, 2),
+        "api_calls": request.calls,
+        "cache": store.stats(),
+        "compaction": compaction,
+        "outbound": dict(
+            app.bot.rate_limiter.stats(),
+            waits={name: stats for name, stats in latency_stats().items() if name.startswith("outbound_wait")}
+        ) if app.bot.rate_limiter else None,
+    }
+
+def print_report(result):
+    print(f"📦 {result['backend']} | {result['users']} משתמשים × {result['entries']} רשומות | "
+          f"{result['rounds']} סבבים | מקביליות {result['concurrency']}")
+    print(f"{'scenario':<16}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, stats in list(result["scenarios"].items()) + [("total", result["total"])]:
+        print(f"{name:<16}{stats['count']:>8}{stats['p50_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+    print(f"⚡ {result['updates_per_sec']} עדכונים/שנייה | flush ממוצע {result['flush_ms']} ms")
+    print(f"🧠 peak RSS {result['peak_rss_mb']} MB | קובץ נתונים {result['data_file_mb']} MB")
+    if result["compaction"]:
+        print(result["compaction"])
+    if result["outbound"]:
+        outbound = result["outbound"]
+        waits = " | ".join(f"{name} p99 {stats['p99_ms']} ms" for name, stats in outbound["waits"].items())
+        print(f"🚦 {outbound['outbound_sent']} נשלחו | {outbound['outbound_coalesced']} אוחדו | {waits}")
+
+def print_dispatch(result):
+    print(f"🧭 ניתוב הודעה | {result['iterations']:,} חזרות")
+    print(f"{'message':<18}{'handlers ns':>14}{'router ns':>12}")
+    for name, stats in result["messages"].items():
+        print(f"{name:<18}{stats['handler_ns']:>14.1f}{stats['router_ns']:>12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the bot handlers")
+    parser.add_argument("--backend", default="sqlite", choices=("sqlite", "json"))
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--entries", type=int, default=1000, help="history entries per user")
+    parser.add_argument("--days", type=int, default=365, help="days the seeded history spans")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--compact", type=int, default=0, metavar="DAYS",
+                        help="compact history older than DAYS before timing")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="send through OutboundLimiter with its real Telegram limits")
+    parser.add_argument("--dispatch", type=int, default=0, metavar="N",
+                        help="only time per-message dispatch, N iterations per message")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+    result = asyncio.run(run_dispatch(args) if args.dispatch else run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif args.dispatch:
+        print_dispatch(result)
+    else:
+        print_report(result)
+
+if __name__ == "__main__":
+    main()
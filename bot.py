@@ -2,10 +2,11 @@
 🏋️ בוט טלגרם למעקב תזונה וכושר
 """
 
-import json
+import asyncio
 import os
-from datetime import datetime, timedelta
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+import tempfile
+from datetime import datetime, time as dtime, timedelta
+from telegram import Update
 from telegram.ext import (
     Application, 
     CommandHandler, 
@@ -15,92 +16,155 @@ from telegram.ext import (
     ContextTypes,
     filters
 )
+from aggregates import TREND_WINDOW
+from archive import ArchiveStore, Compactor
+from cache import AsyncUserStore, UserCache
+from storage import open_storage, migrate_json
+from transfer import FORMATS, ImportReport, detect_format, read_records, write_records
+from metrics import instrument_handlers, latency_stats, log_loop, watch_event_loop
+from persistence import StorePersistence
+from ratelimit import OutboundLimiter
+from reminders import ReminderScheduler, format_time, parse_time
+from router import TextRouter
+from scheduler import PerUserUpdateProcessor
+from texts import catalog
+from webhook import allowed_updates, run_webhook, serve_metrics
 
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL")
+
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "8080"))
+PERSISTENCE_INTERVAL = float(os.environ.get("PERSISTENCE_INTERVAL", "5"))
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_LOG_INTERVAL = float(os.environ.get("METRICS_LOG_INTERVAL", "0"))
+MAX_CONCURRENT_UPDATES = int(os.environ.get("MAX_CONCURRENT_UPDATES", "32"))
+OUTBOUND_RATE = float(os.environ.get("OUTBOUND_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.environ.get("OUTBOUND_CHAT_RATE", "1"))
+BOT_LANGUAGE = os.environ.get("BOT_LANGUAGE", "he")
+REMINDER_BUCKET_MINUTES = int(os.environ.get("REMINDER_BUCKET_MINUTES", "5"))
+REMINDER_RATE = float(os.environ.get("REMINDER_RATE", "25"))
 
 WAITING_MEAL_NAME, WAITING_MEAL_CALORIES, WAITING_MEAL_PROTEIN = range(3)
 WAITING_WORKOUT_TYPE, WAITING_WORKOUT_DURATION = range(10, 12)
 WAITING_WEIGHT = 20
+WAITING_IMPORT_FILE = 30
+
+FLOW_KEYS = ("meal_name", "meal_calories", "workout_type")
+
+MAX_TREND_WEEKS = 52
 
 DATA_FILE = "fitness_data.json"
+DB_FILE = os.environ.get("DB_FILE", "fitness_data.db")
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sqlite")
+
+CACHE_MAX_USERS = int(os.environ.get("CACHE_MAX_USERS", "10000"))
+CACHE_MAX_RECORDS = int(os.environ.get("CACHE_MAX_RECORDS", "1000000"))
+CACHE_FLUSH_INTERVAL = float(os.environ.get("CACHE_FLUSH_INTERVAL", "2"))
+STORAGE_WORKERS = int(os.environ.get("STORAGE_WORKERS", "4"))
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "fitness_archive")
+COMPACT_AFTER_DAYS = int(os.environ.get("COMPACT_AFTER_DAYS", "0"))
+COMPACT_TIME = os.environ.get("COMPACT_TIME", "04:00")
+
+TEXTS = catalog(BOT_LANGUAGE)
+
+storage = None
+reminders = None
+compactor = None
+
+def init_storage(backend=STORAGE_BACKEND):
+    global storage
+    if backend == "sqlite":
+        if not os.path.exists(DB_FILE) and os.path.exists(DATA_FILE):
+            count = migrate_json(DATA_FILE, DB_FILE)
+            print(f"📦 הועברו {count} משתמשים מ-{DATA_FILE}")
+        store = open_storage("sqlite", DB_FILE)
+    else:
+        store = open_storage(backend, DATA_FILE)
+    cache = UserCache(store, max_users=CACHE_MAX_USERS, max_records=CACHE_MAX_RECORDS, archive=ArchiveStore(ARCHIVE_DIR))
+    storage = AsyncUserStore(cache, max_workers=STORAGE_WORKERS)
+    return storage
+
+async def get_user_data(user_id):
+    return await storage.get(user_id)
+
+async def get_aggregates(user_id):
+    return await storage.aggregates(user_id)
 
-def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-def save_data(data):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def get_user_data(user_id):
-    data = load_data()
-    user_id = str(user_id)
-    if user_id not in data:
-        data[user_id] = {
-            "meals": [],
-            "workouts": [],
-            "weights": [],
-            "settings": {"target_calories": 2000, "target_protein": 150}
-        }
-        save_data(data)
-    return data[user_id]
-
-def save_user_data(user_id, user_data):
-    data = load_data()
-    data[str(user_id)] = user_data
-    save_data(data)
+async def get_foods(user_id):
+    return await storage.foods(user_id)
+
+async def add_entry(user_id, kind, entry):
+    async with storage.lock(user_id):
+        return await storage.append(user_id, kind, entry)
+
+async def update_settings(user_id, **changes):
+    async with storage.lock(user_id):
+        user_data = await storage.get(user_id)
+        settings = dict(user_data["settings"], **changes)
+        await storage.save_settings(user_id, settings)
+        return settings
+
+async def flush_loop():
+    while True:
+        await asyncio.sleep(CACHE_FLUSH_INTERVAL)
+        try:
+            await storage.flush()
+        except Exception as e:
+            print(f"⚠️ שגיאה בשמירת נתונים: {e}")
+
+async def post_init(app: Application):
+    global reminders, compactor
+    app.bot_data["flush_task"] = asyncio.create_task(flush_loop())
+    app.bot_data["loop_monitor"] = asyncio.create_task(watch_event_loop())
+    if METRICS_LOG_INTERVAL > 0:
+        app.bot_data["metrics_log"] = asyncio.create_task(log_loop(lambda: collect_stats(app), METRICS_LOG_INTERVAL))
+    if METRICS_PORT:
+        app.bot_data["metrics_server"] = await serve_metrics(METRICS_HOST, METRICS_PORT, lambda: collect_stats(app))
+        print(f"📈 מדדים ב-http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    reminders = ReminderScheduler(storage, today_text, TEXTS, bucket_minutes=REMINDER_BUCKET_MINUTES, rate=REMINDER_RATE)
+    count = await reminders.load()
+    reminders.start(app.bot)
+    if app.job_queue:
+        app.job_queue.run_repeating(
+            reminders.tick, interval=REMINDER_BUCKET_MINUTES * 60, first=reminders.next_delay(), name="reminders"
+        )
+        print(f"⏰ {count} משתמשים רשומים לתזכורות")
+        if COMPACT_AFTER_DAYS:
+            compactor = Compactor(storage, COMPACT_AFTER_DAYS)
+            minutes = parse_time(COMPACT_TIME)
+            # Local time, like the reminders; PTB reads a naive time as UTC
+            local = datetime.now().astimezone().tzinfo
+            app.job_queue.run_daily(
+                compactor.tick, time=dtime(minutes // 60, minutes % 60, tzinfo=local), name="compaction"
+            )
+            print(f"🗄️ דחיסת היסטוריה מעל {COMPACT_AFTER_DAYS} ימים כל יום ב-{COMPACT_TIME}")
+    else:
+        print("⚠️ JobQueue לא זמין - התקן python-telegram-bot[job-queue] להפעלת תזכורות")
+
+async def post_shutdown(app: Application):
+    for name in ("flush_task", "loop_monitor", "metrics_log"):
+        if name in app.bot_data:
+            app.bot_data[name].cancel()
+    if "metrics_server" in app.bot_data:
+        await app.bot_data["metrics_server"].cleanup()
+    if reminders:
+        await reminders.stop()
+    await storage.close()
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [
-        ["🍽️ הוסף ארוחה", "💪 הוסף אימון"],
-        ["⚖️ עדכן משקל", "📊 סיכום יומי"],
-        ["📈 סיכום שבועי", "⚙️ הגדרות"]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-    
-    await update.message.reply_text(
-        "🏋️ *ברוך הבא לבוט מעקב תזונה וכושר!*\n\n"
-        "אני אעזור לך לעקוב אחרי:\n"
-        "• 🍽️ ארוחות וקלוריות\n"
-        "• 💪 אימונים\n"
-        "• ⚖️ משקל\n\n"
-        "בחר אפשרות מהתפריט!",
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
-    )
+    await update.message.reply_text(TEXTS.start, reply_markup=TEXTS.main_keyboard, parse_mode='Markdown')
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(
-        "📖 *פקודות:*\n\n"
-        "/meal - הוסף ארוחה\n"
-        "/workout - הוסף אימון\n"
-        "/weight - עדכן משקל\n"
-        "/today - סיכום יומי\n"
-        "/week - סיכום שבועי\n\n"
-        "*קיצורים:*\n"
-        "`ארוחה: שם, קלוריות, חלבון`\n"
-        "`אימון: סוג, דקות`\n"
-        "`משקל: 75.5`",
-        parse_mode='Markdown'
-    )
+    await update.message.reply_text(TEXTS.help, parse_mode='Markdown')
 
 async def add_meal_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [
-        [InlineKeyboardButton("☕ בוקר - 350 קל'", callback_data="quick_meal_בוקר_350_15")],
-        [InlineKeyboardButton("🥗 סלט עוף - 450 קל'", callback_data="quick_meal_סלט עוף_450_40")],
-        [InlineKeyboardButton("🥤 שייק חלבון - 250 קל'", callback_data="quick_meal_שייק חלבון_250_30")],
-        [InlineKeyboardButton("🥪 סנדוויץ' - 400 קל'", callback_data="quick_meal_סנדוויץ'_400_20")],
-        [InlineKeyboardButton("🍝 צהריים - 600 קל'", callback_data="quick_meal_צהריים_600_35")],
-        [InlineKeyboardButton("🍽️ ערב - 500 קל'", callback_data="quick_meal_ערב_500_30")],
-        [InlineKeyboardButton("✏️ הזנה ידנית", callback_data="manual_meal")]
-    ]
-    await update.message.reply_text(
-        "🍽️ *הוספת ארוחה*\n\nבחר או הזן ידנית:",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
-    )
+    await update.message.reply_text(TEXTS.meal_menu, reply_markup=TEXTS.meal_keyboard, parse_mode='Markdown')
     return WAITING_MEAL_NAME
 
 async def quick_meal_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -108,43 +172,56 @@ async def quick_meal_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     await query.answer()
     
     if query.data == "manual_meal":
-        await query.edit_message_text("✏️ הקלד את שם הארוחה:")
+        await query.edit_message_text(TEXTS.meal_name_prompt)
         return WAITING_MEAL_NAME
     
-    parts = query.data.replace("quick_meal_", "").split("_")
+    if query.data == "new_meal":
+        await query.edit_message_text(TEXTS.calories_prompt)
+        return WAITING_MEAL_CALORIES
+    
+    context.user_data.pop('meal_name', None)
+    parts = query.data.replace("quick_meal_", "").rsplit("_", 2)
     name, calories, protein = parts[0], int(parts[1]), int(parts[2])
     
-    user_data = get_user_data(query.from_user.id)
-    user_data["meals"].append({
+    user_data = await add_entry(query.from_user.id, "meals", {
         "name": name, "calories": calories, "protein": protein,
         "date": datetime.now().isoformat()
     })
-    save_user_data(query.from_user.id, user_data)
-    
-    today = datetime.now().date()
-    today_meals = [m for m in user_data["meals"] if datetime.fromisoformat(m["date"]).date() == today]
-    total_cal = sum(m["calories"] for m in today_meals)
-    target = user_data["settings"]["target_calories"]
     
+    aggregates = await get_aggregates(query.from_user.id)
     await query.edit_message_text(
-        f"✅ *נרשם: {name}*\n🔥 {calories} קל' | 💪 {protein}g\n\n"
-        f"📊 היום: {total_cal}/{target} קל' ({int(total_cal/target*100)}%)",
-        parse_mode='Markdown'
+        meal_logged_text(user_data, aggregates, name, calories, protein), parse_mode='Markdown'
     )
     return ConversationHandler.END
 
+def meal_logged_text(user_data, aggregates, name, calories, protein):
+    total = aggregates.day(datetime.now().date()).calories
+    target = user_data["settings"]["target_calories"]
+    return TEXTS.meal_logged(
+        name=name, calories=calories, protein=protein,
+        total=total, target=target, pct=int(total / target * 100) if target else 0
+    )
+
 async def meal_name_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data['meal_name'] = update.message.text
-    await update.message.reply_text("🔥 כמה קלוריות?")
+    name = update.message.text
+    if 'meal_name' in context.user_data and name.strip().isdigit():
+        return await meal_calories_received(update, context)
+    context.user_data['meal_name'] = name
+    foods = await get_foods(update.effective_user.id)
+    keyboard = TEXTS.food_keyboard(foods.search(name), name)
+    if keyboard:
+        await update.message.reply_text(TEXTS.food_matches, reply_markup=keyboard, parse_mode='Markdown')
+        return WAITING_MEAL_NAME
+    await update.message.reply_text(TEXTS.calories_prompt)
     return WAITING_MEAL_CALORIES
 
 async def meal_calories_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         context.user_data['meal_calories'] = int(update.message.text)
-        await update.message.reply_text("💪 כמה גרם חלבון? (או 0)")
+        await update.message.reply_text(TEXTS.protein_prompt)
         return WAITING_MEAL_PROTEIN
     except ValueError:
-        await update.message.reply_text("❌ מספר בלבד")
+        await update.message.reply_text(TEXTS.number_only)
         return WAITING_MEAL_CALORIES
 
 async def meal_protein_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -153,45 +230,22 @@ async def meal_protein_received(update: Update, context: ContextTypes.DEFAULT_TY
     except:
         protein = 0
     
-    user_data = get_user_data(update.effective_user.id)
     meal = {
-        "name": context.user_data['meal_name'],
-        "calories": context.user_data['meal_calories'],
+        "name": context.user_data.pop('meal_name'),
+        "calories": context.user_data.pop('meal_calories'),
         "protein": protein,
         "date": datetime.now().isoformat()
     }
-    user_data["meals"].append(meal)
-    save_user_data(update.effective_user.id, user_data)
-    
-    today = datetime.now().date()
-    today_meals = [m for m in user_data["meals"] if datetime.fromisoformat(m["date"]).date() == today]
-    total_cal = sum(m["calories"] for m in today_meals)
-    target = user_data["settings"]["target_calories"]
+    user_data = await add_entry(update.effective_user.id, "meals", meal)
     
+    aggregates = await get_aggregates(update.effective_user.id)
     await update.message.reply_text(
-        f"✅ *נרשם: {meal['name']}*\n🔥 {meal['calories']} קל' | 💪 {protein}g\n\n"
-        f"📊 היום: {total_cal}/{target} קל'",
-        parse_mode='Markdown'
+        meal_logged_text(user_data, aggregates, meal["name"], meal["calories"], protein), parse_mode='Markdown'
     )
     return ConversationHandler.END
 
 async def add_workout_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [
-        [InlineKeyboardButton("🏃 ריצה", callback_data="workout_ריצה"),
-         InlineKeyboardButton("🚶 הליכה", callback_data="workout_הליכה")],
-        [InlineKeyboardButton("🏋️ חדר כושר", callback_data="workout_חדר כושר"),
-         InlineKeyboardButton("🚴 אופניים", callback_data="workout_אופניים")],
-        [InlineKeyboardButton("🏀 כדורסל", callback_data="workout_כדורסל"),
-         InlineKeyboardButton("⚽ כדורגל", callback_data="workout_כדורגל")],
-        [InlineKeyboardButton("🏊 שחייה", callback_data="workout_שחייה"),
-         InlineKeyboardButton("🧘 יוגה", callback_data="workout_יוגה")],
-        [InlineKeyboardButton("✏️ אחר", callback_data="workout_custom")]
-    ]
-    await update.message.reply_text(
-        "💪 *הוספת אימון*\n\nבחר סוג:",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
-    )
+    await update.message.reply_text(TEXTS.workout_menu, reply_markup=TEXTS.workout_keyboard, parse_mode='Markdown')
     return WAITING_WORKOUT_TYPE
 
 async def workout_type_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -200,245 +254,386 @@ async def workout_type_callback(update: Update, context: ContextTypes.DEFAULT_TY
     workout_type = query.data.replace("workout_", "")
     
     if workout_type == "custom":
-        await query.edit_message_text("✏️ הקלד סוג אימון:")
+        await query.edit_message_text(TEXTS.workout_type_prompt)
         return WAITING_WORKOUT_TYPE
     
     context.user_data['workout_type'] = workout_type
-    await query.edit_message_text(f"⏱️ כמה דקות {workout_type}?")
+    await query.edit_message_text(TEXTS.workout_duration_prompt(type=workout_type))
     return WAITING_WORKOUT_DURATION
 
 async def workout_type_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['workout_type'] = update.message.text
-    await update.message.reply_text("⏱️ כמה דקות?")
+    await update.message.reply_text(TEXTS.duration_prompt)
     return WAITING_WORKOUT_DURATION
 
 async def workout_duration_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         duration = int(update.message.text)
     except:
-        await update.message.reply_text("❌ מספר בלבד")
+        await update.message.reply_text(TEXTS.number_only)
         return WAITING_WORKOUT_DURATION
     
-    user_data = get_user_data(update.effective_user.id)
-    user_data["workouts"].append({
-        "type": context.user_data['workout_type'],
+    workout_type = context.user_data.pop('workout_type')
+    user_data = await add_entry(update.effective_user.id, "workouts", {
+        "type": workout_type,
         "duration": duration,
         "date": datetime.now().isoformat()
     })
-    save_user_data(update.effective_user.id, user_data)
     
-    week_ago = datetime.now() - timedelta(days=7)
-    week_workouts = [w for w in user_data["workouts"] if datetime.fromisoformat(w["date"]) > week_ago]
-    total_minutes = sum(w["duration"] for w in week_workouts)
+    aggregates = await get_aggregates(update.effective_user.id)
+    total_minutes = aggregates.since(datetime.now() - timedelta(days=7)).workout_minutes
     
     await update.message.reply_text(
-        f"✅ *נרשם: {context.user_data['workout_type']}*\n⏱️ {duration} דקות\n\n"
-        f"📊 השבוע: {total_minutes} דקות",
+        TEXTS.workout_logged(type=workout_type, duration=duration, week_minutes=total_minutes),
         parse_mode='Markdown'
     )
     return ConversationHandler.END
 
+def last_weight(user_data, back=1):
+    """The ``back``-th latest weigh-in, continuing into the daily summaries of compacted history."""
+    weights = user_data["weights"]
+    if len(weights) >= back:
+        return weights[-back]["value"]
+    back -= len(weights)
+    for value in reversed(user_data["days"].column("weight")):
+        if value:
+            back -= 1
+            if not back:
+                return value
+    return None
+
 async def add_weight_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_data = get_user_data(update.effective_user.id)
+    user_data = await get_user_data(update.effective_user.id)
     last = ""
-    if user_data["weights"]:
-        w = user_data["weights"][-1]
-        last = f"\n📌 אחרון: {w['value']} ק\"ג"
+    previous = last_weight(user_data)
+    if previous is not None:
+        last = TEXTS.last_weight(value=previous)
     
-    await update.message.reply_text(f"⚖️ *עדכון משקל*{last}\n\nהקלד משקל:", parse_mode='Markdown')
+    await update.message.reply_text(TEXTS.weight_prompt(last=last), parse_mode='Markdown')
     return WAITING_WEIGHT
 
 async def weight_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         weight = float(update.message.text.replace(",", "."))
     except:
-        await update.message.reply_text("❌ מספר בלבד (לדוגמה: 75.5)")
+        await update.message.reply_text(TEXTS.weight_number_only)
         return WAITING_WEIGHT
     
-    user_data = get_user_data(update.effective_user.id)
-    user_data["weights"].append({"value": weight, "date": datetime.now().isoformat()})
-    save_user_data(update.effective_user.id, user_data)
+    user_data = await add_entry(update.effective_user.id, "weights", {"value": weight, "date": datetime.now().isoformat()})
     
     change = ""
-    if len(user_data["weights"]) > 1:
-        diff = weight - user_data["weights"][-2]["value"]
-        emoji = "📈" if diff > 0 else "📉" if diff < 0 else "➡️"
-        change = f"\n{emoji} שינוי: {diff:+.1f} ק\"ג"
+    previous = last_weight(user_data, 2)
+    if previous is not None:
+        diff = weight - previous
+        change = TEXTS.weight_diff(trend=TEXTS.arrow(diff), diff=diff)
     
-    await update.message.reply_text(f"✅ *משקל: {weight} ק\"ג*{change}", parse_mode='Markdown')
+    await update.message.reply_text(TEXTS.weight_logged(value=weight, change=change), parse_mode='Markdown')
     return ConversationHandler.END
 
-async def today_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_data = get_user_data(update.effective_user.id)
-    today = datetime.now().date()
-    
-    today_meals = [m for m in user_data["meals"] if datetime.fromisoformat(m["date"]).date() == today]
-    today_workouts = [w for w in user_data["workouts"] if datetime.fromisoformat(w["date"]).date() == today]
-    
-    total_cal = sum(m["calories"] for m in today_meals)
-    total_protein = sum(m.get("protein", 0) for m in today_meals)
-    total_workout = sum(w["duration"] for w in today_workouts)
-    
+def today_text(user_data, aggregates, today):
+    day = aggregates.day(today)
     target_cal = user_data["settings"]["target_calories"]
     target_protein = user_data["settings"]["target_protein"]
     
-    cal_pct = int(total_cal / target_cal * 100) if target_cal else 0
-    protein_pct = int(total_protein / target_protein * 100) if target_protein else 0
-    
-    cal_bar = "█" * min(10, cal_pct // 10) + "░" * (10 - min(10, cal_pct // 10))
-    protein_bar = "█" * min(10, protein_pct // 10) + "░" * (10 - min(10, protein_pct // 10))
-    
-    meals_list = "\n".join([f"  • {m['name']} - {m['calories']} קל'" for m in today_meals]) or "  אין"
-    workouts_list = "\n".join([f"  • {w['type']} - {w['duration']} דק'" for w in today_workouts]) or "  אין"
-    
+    cal_pct = int(day.calories / target_cal * 100) if target_cal else 0
+    protein_pct = int(day.protein / target_protein * 100) if target_protein else 0
+    
+    return TEXTS.today(
+        date=today,
+        calories=day.calories, target_calories=target_cal,
+        calories_bar=TEXTS.bar(cal_pct), calories_pct=cal_pct,
+        protein=day.protein, target_protein=target_protein,
+        protein_bar=TEXTS.bar(protein_pct), protein_pct=protein_pct,
+        workout_minutes=day.workout_minutes,
+        meals=TEXTS.lines(TEXTS.meal_line, day.meals),
+        workouts=TEXTS.lines(TEXTS.workout_line, day.workouts)
+    )
+
+async def today_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = await get_user_data(update.effective_user.id)
+    aggregates = await get_aggregates(update.effective_user.id)
     await update.message.reply_text(
-        f"📊 *סיכום יומי - {today.strftime('%d/%m')}*\n\n"
-        f"🔥 *קלוריות:* {total_cal}/{target_cal}\n[{cal_bar}] {cal_pct}%\n\n"
-        f"💪 *חלבון:* {total_protein}g/{target_protein}g\n[{protein_bar}] {protein_pct}%\n\n"
-        f"🏃 *אימון:* {total_workout} דקות\n\n"
-        f"🍽️ *ארוחות:*\n{meals_list}\n\n"
-        f"💪 *אימונים:*\n{workouts_list}",
+        today_text(user_data, aggregates, datetime.now().date()),
         parse_mode='Markdown'
     )
 
 async def week_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_data = get_user_data(update.effective_user.id)
-    week_ago = datetime.now() - timedelta(days=7)
-    
-    week_meals = [m for m in user_data["meals"] if datetime.fromisoformat(m["date"]) > week_ago]
-    week_workouts = [w for w in user_data["workouts"] if datetime.fromisoformat(w["date"]) > week_ago]
-    week_weights = [w for w in user_data["weights"] if datetime.fromisoformat(w["date"]) > week_ago]
-    
-    total_cal = sum(m["calories"] for m in week_meals)
-    avg_cal = int(total_cal / 7) if week_meals else 0
-    total_protein = sum(m.get("protein", 0) for m in week_meals)
-    total_workout = sum(w["duration"] for w in week_workouts)
-    workout_count = len(week_workouts)
-    workout_days = len(set(datetime.fromisoformat(w["date"]).date() for w in week_workouts))
+    aggregates = await get_aggregates(update.effective_user.id)
+    week = aggregates.since(datetime.now() - timedelta(days=7))
+    week_weights = week.weights
     
     weight_change = ""
     if len(week_weights) >= 2:
-        diff = week_weights[-1]["value"] - week_weights[0]["value"]
-        emoji = "📈" if diff > 0 else "📉" if diff < 0 else "➡️"
-        weight_change = f"\n\n⚖️ *שינוי משקל:* {emoji} {diff:+.1f} ק\"ג"
+        weight_change = TEXTS.change(week_weights[-1]["value"] - week_weights[0]["value"])
     
     await update.message.reply_text(
-        f"📈 *סיכום שבועי*\n\n"
-        f"🔥 *קלוריות:* {total_cal:,} (ממוצע: {avg_cal:,}/יום)\n"
-        f"💪 *חלבון:* {total_protein}g\n\n"
-        f"🏃 *אימונים:* {workout_count} ({total_workout} דק')\n"
-        f"📅 *ימים פעילים:* {workout_days}/7"
-        f"{weight_change}",
+        TEXTS.week(
+            calories=week.calories,
+            avg_calories=int(week.calories / week.meal_days) if week.meal_days else 0,
+            protein=week.protein,
+            workout_count=week.workout_count,
+            workout_minutes=week.workout_minutes,
+            workout_days=week.workout_days,
+            weight_change=weight_change
+        ),
+        parse_mode='Markdown'
+    )
+
+def report_text(user_data, aggregates, first, last, title, archived=None):
+    settings = user_data["settings"]
+    report = aggregates.report(first, last, settings["target_calories"], settings["target_protein"], archived)
+    types = sorted(report.workout_types.items(), key=lambda item: item[1][1], reverse=True)
+    workout_types = "".join(
+        "\n" + TEXTS.workout_type_line(type=kind, count=count, minutes=minutes) for kind, (count, minutes) in types
+    )
+    return TEXTS.report(
+        title=title, first=first, last=last, days=report.days,
+        calories=report.calories,
+        avg_calories=report.calories // report.meal_days if report.meal_days else 0,
+        protein=report.protein,
+        avg_protein=report.protein // report.meal_days if report.meal_days else 0,
+        meal_days=report.meal_days,
+        calorie_days=report.calorie_days, protein_days=report.protein_days,
+        workout_count=report.workout_count, workout_minutes=report.workout_minutes,
+        workout_days=report.workout_days, workout_types=workout_types,
+        weight_change=TEXTS.trend_change(report.trend, TREND_WINDOW)
+    )
+
+def trend_text(aggregates, today, weeks):
+    first = today - timedelta(weeks=weeks, days=-1)
+    lines = []
+    trend = []
+    for week in range(weeks):
+        start = first + timedelta(weeks=week)
+        report = aggregates.report(start, start + timedelta(days=6))
+        trend += report.trend
+        weight = f"{report.trend[-1][1]:.1f}" if report.trend else TEXTS.no_weight
+        lines.append(TEXTS.trend_line(
+            start=start,
+            avg_calories=report.calories // report.meal_days if report.meal_days else 0,
+            workout_minutes=report.workout_minutes, weight=weight
+        ))
+    return TEXTS.trend_report(weeks=weeks, lines="\n".join(lines), weight_change=TEXTS.trend_change(trend, TREND_WINDOW))
+
+def parse_date(text):
+    for pattern in ("%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, pattern).date()
+        except ValueError:
+            pass
+    raise ValueError(text)
+
+async def get_report(user_id, first, last, title):
+    user_data = await get_user_data(user_id)
+    aggregates = await get_aggregates(user_id)
+    archived = None
+    if aggregates.needs_archive(first):
+        archived = await storage.archived(user_id, first, last, ("workouts",))
+    return report_text(user_data, aggregates, first, last, title, archived)
+
+async def month_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    today = datetime.now().date()
+    await update.message.reply_text(
+        await get_report(update.effective_user.id, today - timedelta(days=29), today, TEXTS.month_title),
+        parse_mode='Markdown'
+    )
+
+async def trend_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        weeks = min(max(int(context.args[0]), 1), MAX_TREND_WEEKS) if context.args else 12
+    except ValueError:
+        weeks = 12
+    aggregates = await get_aggregates(update.effective_user.id)
+    await update.message.reply_text(trend_text(aggregates, datetime.now().date(), weeks), parse_mode='Markdown')
+
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    today = datetime.now().date()
+    try:
+        if len(context.args) == 1 and context.args[0].isdigit():
+            first, last = today - timedelta(days=max(int(context.args[0]), 1) - 1), today
+        elif len(context.args) in (1, 2):
+            first = parse_date(context.args[0])
+            last = parse_date(context.args[1]) if len(context.args) == 2 else today
+        else:
+            raise ValueError(context.args)
+    except (ValueError, OverflowError):
+        await update.message.reply_text(TEXTS.report_usage)
+        return
+    first, last = min(first, last), max(first, last)
+    await update.message.reply_text(
+        await get_report(update.effective_user.id, first, last, TEXTS.range_title),
         parse_mode='Markdown'
     )
 
 async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_data = get_user_data(update.effective_user.id)
+    user_data = await get_user_data(update.effective_user.id)
     s = user_data["settings"]
     await update.message.reply_text(
-        f"⚙️ *הגדרות*\n\n"
-        f"🎯 יעד קלוריות: {s['target_calories']}\n"
-        f"💪 יעד חלבון: {s['target_protein']}g\n\n"
-        f"לשינוי:\n/setcalories 2000\n/setprotein 150",
+        TEXTS.settings(
+            target_calories=s['target_calories'], target_protein=s['target_protein'],
+            digest=s.get('digest_time') or TEXTS.off, lunch=s.get('lunch_reminder') or TEXTS.off
+        ),
         parse_mode='Markdown'
     )
 
 async def set_calories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         target = int(context.args[0])
-        user_data = get_user_data(update.effective_user.id)
-        user_data["settings"]["target_calories"] = target
-        save_user_data(update.effective_user.id, user_data)
-        await update.message.reply_text(f"✅ יעד קלוריות: {target}")
+        await update_settings(update.effective_user.id, target_calories=target)
+        await update.message.reply_text(TEXTS.calories_set(target))
     except:
-        await update.message.reply_text("שימוש: /setcalories 2000")
+        await update.message.reply_text(TEXTS.calories_usage)
 
 async def set_protein(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         target = int(context.args[0])
-        user_data = get_user_data(update.effective_user.id)
-        user_data["settings"]["target_protein"] = target
-        save_user_data(update.effective_user.id, user_data)
-        await update.message.reply_text(f"✅ יעד חלבון: {target}g")
+        await update_settings(update.effective_user.id, target_protein=target)
+        await update.message.reply_text(TEXTS.protein_set(target))
     except:
-        await update.message.reply_text("שימוש: /setprotein 150")
+        await update.message.reply_text(TEXTS.protein_usage)
 
-async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def log_meal_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text.strip()
-    
-    if text.startswith("ארוחה:") or text.startswith("אכלתי"):
-        try:
-            parts = text.split(":", 1)[1].strip().split(",")
-            name = parts[0].strip()
-            calories = int(parts[1].strip()) if len(parts) > 1 else 0
-            protein = int(parts[2].strip()) if len(parts) > 2 else 0
-            
-            user_data = get_user_data(update.effective_user.id)
-            user_data["meals"].append({
-                "name": name, "calories": calories, "protein": protein,
-                "date": datetime.now().isoformat()
-            })
-            save_user_data(update.effective_user.id, user_data)
-            await update.message.reply_text(f"✅ {name}\n🔥 {calories} קל' | 💪 {protein}g")
-        except:
-            await update.message.reply_text("פורמט: ארוחה: שם, קלוריות, חלבון")
-    
-    elif text.startswith("אימון:") or text.startswith("התאמנתי"):
-        try:
-            parts = text.split(":", 1)[1].strip().split(",")
-            workout_type = parts[0].strip()
-            duration = int(parts[1].strip()) if len(parts) > 1 else 30
-            
-            user_data = get_user_data(update.effective_user.id)
-            user_data["workouts"].append({
-                "type": workout_type, "duration": duration,
-                "date": datetime.now().isoformat()
-            })
-            save_user_data(update.effective_user.id, user_data)
-            await update.message.reply_text(f"✅ {workout_type}\n⏱️ {duration} דקות")
-        except:
-            await update.message.reply_text("פורמט: אימון: סוג, דקות")
-    
-    elif text.startswith("משקל:"):
-        try:
-            weight = float(text.split(":", 1)[1].strip().replace(",", "."))
-            user_data = get_user_data(update.effective_user.id)
-            user_data["weights"].append({"value": weight, "date": datetime.now().isoformat()})
-            save_user_data(update.effective_user.id, user_data)
-            await update.message.reply_text(f"✅ משקל: {weight} ק\"ג")
-        except:
-            await update.message.reply_text("פורמט: משקל: 75.5")
-    
-    elif text == "🍽️ הוסף ארוחה":
-        return await add_meal_start(update, context)
-    elif text == "💪 הוסף אימון":
-        return await add_workout_start(update, context)
-    elif text == "⚖️ עדכן משקל":
-        return await add_weight_start(update, context)
-    elif text == "📊 סיכום יומי":
-        return await today_summary(update, context)
-    elif text == "📈 סיכום שבועי":
-        return await week_summary(update, context)
-    elif text == "⚙️ הגדרות":
-        return await settings(update, context)
+    try:
+        parts = text.split(":", 1)[1].strip().split(",")
+        name = parts[0].strip()
+        calories = int(parts[1].strip()) if len(parts) > 1 else 0
+        protein = int(parts[2].strip()) if len(parts) > 2 else 0
+        if len(parts) == 1:
+            food = (await get_foods(update.effective_user.id)).get(name)
+            if food:
+                name, calories, protein = food.name, food.calories, food.protein
+        
+        await add_entry(update.effective_user.id, "meals", {
+            "name": name, "calories": calories, "protein": protein,
+            "date": datetime.now().isoformat()
+        })
+        await update.message.reply_text(TEXTS.meal_shortcut_logged(name=name, calories=calories, protein=protein))
+    except:
+        await update.message.reply_text(TEXTS.meal_shortcut_usage)
 
-async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("❌ בוטל")
+async def log_workout_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = update.message.text.strip()
+    try:
+        parts = text.split(":", 1)[1].strip().split(",")
+        workout_type = parts[0].strip()
+        duration = int(parts[1].strip()) if len(parts) > 1 else 30
+        
+        await add_entry(update.effective_user.id, "workouts", {
+            "type": workout_type, "duration": duration,
+            "date": datetime.now().isoformat()
+        })
+        await update.message.reply_text(TEXTS.workout_shortcut_logged(type=workout_type, duration=duration))
+    except:
+        await update.message.reply_text(TEXTS.workout_shortcut_usage)
+
+async def log_weight_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = update.message.text.strip()
+    try:
+        weight = float(text.split(":", 1)[1].strip().replace(",", "."))
+        await add_entry(update.effective_user.id, "weights", {"value": weight, "date": datetime.now().isoformat()})
+        await update.message.reply_text(TEXTS.weight_shortcut_logged(value=weight))
+    except:
+        await update.message.reply_text(TEXTS.weight_shortcut_usage)
+
+TEXT_ROUTER = TextRouter()
+for kind, callback in (("meal", log_meal_text), ("workout", log_workout_text), ("weight", log_weight_text)):
+    for prefix in TEXTS.shortcuts[kind]:
+        TEXT_ROUTER.add_prefix(prefix, callback)
+for action, callback in (
+    ("meal", add_meal_start), ("workout", add_workout_start), ("weight", add_weight_start),
+    ("today", today_summary), ("week", week_summary), ("settings", settings)
+):
+    TEXT_ROUTER.add_exact(TEXTS.buttons[action], callback)
+
+async def set_reminder(update, context, kind):
+    user_id = update.effective_user.id
+    arg = context.args[0].lower() if context.args else ""
+    if arg in ("off", TEXTS.off):
+        await reminders.subscribe(user_id, kind, None)
+        await update.message.reply_text(TEXTS.reminder_disabled[kind])
+        return
+    try:
+        minutes = parse_time(arg)
+    except ValueError:
+        current = reminders.scheduled(user_id, kind)
+        status = TEXTS.reminder_current(format_time(current)) if current is not None else ""
+        await update.message.reply_text(f"{TEXTS.reminder_usage[kind]}{status}")
+        return
+    value = await reminders.subscribe(user_id, kind, minutes)
+    await update.message.reply_text(TEXTS.reminder_enabled[kind](value))
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await set_reminder(update, context, "digest")
+
+async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await set_reminder(update, context, "lunch")
+
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    callback = TEXT_ROUTER.match(update.message.text.strip())
+    if callback is not None:
+        return await callback(update, context)
+
+async def import_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(TEXTS.import_start, parse_mode='Markdown')
+    return WAITING_IMPORT_FILE
+
+async def import_file_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    document = update.message.document
+    fmt = detect_format(document.file_name)
+    if not fmt:
+        await update.message.reply_text(TEXTS.import_formats)
+        return WAITING_IMPORT_FILE
+    
+    await update.message.reply_text(TEXTS.importing)
+    user_id = update.effective_user.id
+    report = ImportReport()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"import.{fmt}")
+        file = await document.get_file()
+        await file.download_to_drive(path)
+        async with storage.lock(user_id):
+            await storage.bulk_import(user_id, read_records(path, fmt, report))
+    
+    errors = ""
+    if report.failed:
+        lines = "".join(TEXTS.import_error_line(line=line, reason=reason) for line, reason in report.errors)
+        errors = TEXTS.import_errors(failed=report.failed, lines=lines)
+    await update.message.reply_text(TEXTS.import_done(
+        imported=report.imported, meals=report.counts['meals'], workouts=report.counts['workouts'],
+        weights=report.counts['weights'], errors=errors
+    ))
     return ConversationHandler.END
 
-def main():
-    if not BOT_TOKEN:
-        print("❌ חסר BOT_TOKEN!")
+async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    fmt = context.args[0].lower() if context.args else "csv"
+    if fmt not in FORMATS:
+        await update.message.reply_text(TEXTS.export_usage)
         return
     
-    print("🏋️ מתחיל את הבוט...")
-    
-    app = Application.builder().token(BOT_TOKEN).build()
-    
+    user_id = update.effective_user.id
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"fitness_{datetime.now().strftime('%Y%m%d')}.{fmt}")
+        count = await storage.export(user_id, lambda records: write_records(records, path, fmt))
+        if not count:
+            await update.message.reply_text(TEXTS.export_empty)
+            return
+        with open(path, 'rb') as f:
+            await update.message.reply_document(f, filename=os.path.basename(path), caption=TEXTS.export_caption(count=count))
+
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    for key in FLOW_KEYS:
+        context.user_data.pop(key, None)
+    await update.message.reply_text(TEXTS.cancelled)
+    return ConversationHandler.END
+
+def add_handlers(app):
     meal_handler = ConversationHandler(
+        name="meal",
+        persistent=True,
         entry_points=[
             CommandHandler("meal", add_meal_start),
-            MessageHandler(filters.Regex("^🍽️ הוסף ארוחה$"), add_meal_start)
+            MessageHandler(filters.Text((TEXTS.buttons["meal"],)), add_meal_start)
         ],
         states={
             WAITING_MEAL_NAME: [
@@ -452,9 +647,11 @@ def main():
     )
     
     workout_handler = ConversationHandler(
+        name="workout",
+        persistent=True,
         entry_points=[
             CommandHandler("workout", add_workout_start),
-            MessageHandler(filters.Regex("^💪 הוסף אימון$"), add_workout_start)
+            MessageHandler(filters.Text((TEXTS.buttons["workout"],)), add_workout_start)
         ],
         states={
             WAITING_WORKOUT_TYPE: [
@@ -467,9 +664,11 @@ def main():
     )
     
     weight_handler = ConversationHandler(
+        name="weight",
+        persistent=True,
         entry_points=[
             CommandHandler("weight", add_weight_start),
-            MessageHandler(filters.Regex("^⚖️ עדכן משקל$"), add_weight_start)
+            MessageHandler(filters.Text((TEXTS.buttons["weight"],)), add_weight_start)
         ],
         states={
             WAITING_WEIGHT: [MessageHandler(filters.TEXT & ~filters.COMMAND, weight_received)],
@@ -477,21 +676,77 @@ def main():
         fallbacks=[CommandHandler("cancel", cancel)]
     )
     
+    import_handler = ConversationHandler(
+        name="import",
+        persistent=True,
+        entry_points=[CommandHandler("import", import_start)],
+        states={
+            WAITING_IMPORT_FILE: [MessageHandler(filters.Document.ALL, import_file_received)],
+        },
+        fallbacks=[CommandHandler("cancel", cancel)]
+    )
+    
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("today", today_summary))
     app.add_handler(CommandHandler("week", week_summary))
+    app.add_handler(CommandHandler("month", month_summary))
+    app.add_handler(CommandHandler("trend", trend_summary))
+    app.add_handler(CommandHandler("report", report_command))
     app.add_handler(CommandHandler("settings", settings))
     app.add_handler(CommandHandler("setcalories", set_calories))
     app.add_handler(CommandHandler("setprotein", set_protein))
+    app.add_handler(CommandHandler("export", export_data))
+    app.add_handler(CommandHandler("digest", digest_command))
+    app.add_handler(CommandHandler("remind", remind_command))
     
     app.add_handler(meal_handler)
     app.add_handler(workout_handler)
     app.add_handler(weight_handler)
+    app.add_handler(import_handler)
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    instrument_handlers(app)
+
+def collect_stats(app):
+    return {
+        **storage.stats(),
+        **app.update_processor.stats(),
+        **(reminders.stats() if reminders else {}),
+        **(compactor.stats() if compactor else {}),
+        **(app.bot.rate_limiter.stats() if app.bot.rate_limiter else {}),
+        "handlers": latency_stats(),
+    }
+
+def main():
+    if not BOT_TOKEN:
+        print("❌ חסר BOT_TOKEN!")
+        return
+    
+    print("🏋️ מתחיל את הבוט...")
     
-    print("🏋️ הבוט פועל!")
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    init_storage()
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .persistence(StorePersistence(storage, update_interval=PERSISTENCE_INTERVAL))
+        .rate_limiter(OutboundLimiter(global_rate=OUTBOUND_RATE, chat_rate=OUTBOUND_CHAT_RATE))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+    app = builder.build()
+    add_handlers(app)
+    
+    if BOT_MODE == "webhook":
+        print(f"🏋️ הבוט פועל! (webhook על פורט {PORT})")
+        asyncio.run(run_webhook(
+            app, WEBHOOK_HOST, PORT, WEBHOOK_PATH, url=WEBHOOK_URL, secret=WEBHOOK_SECRET
+        ))
+    else:
+        print("🏋️ הבוט פועל!")
+        app.run_polling(allowed_updates=allowed_updates(app))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,442 @@
+"""
+🧠 מטמון משתמשים בזיכרון עם כתיבה מאוחרת
+"""
+
+import asyncio
+import contextlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+from aggregates import UserAggregates
+from archive import apply_compaction, plan_compaction
+from foods import FoodCatalog
+from history import LOGS, RAW_KINDS, from_json, new_history, to_json
+from metrics import latency
+
+def user_size(user_data):
+    return 1 + sum(len(user_data[kind]) for kind in LOGS)
+
+def log_lengths(user_data):
+    return tuple(len(user_data[kind]) for kind in LOGS)
+
+class UserCache:
+    """LRU cache of user records in front of a storage backend.
+
+    Users are held in the columnar form from ``history`` and converted to the
+    JSON schema only at the backend boundary. Reads are served from memory; writes update the cached record and queue an
+    op that ``flush`` hands to the backend as one ``write_batch``. The memory cap
+    is counted in records (one per user plus one per meal/workout/weight); dirty
+    users are never evicted until their ops are on disk.
+    """
+
+    def __init__(self, backend, max_users=10000, max_records=1_000_000, archive=None):
+        self.backend = backend
+        self.archive = archive
+        self.max_users = max_users
+        self.max_records = max_records
+        self.users = OrderedDict()
+        self.sizes = {}
+        self.aggregates = {}
+        self.foods = {}
+        self.generations = {}
+        self.importing = set()
+        self.records = 0
+        self.pending = []
+        self.dirty = set()
+        self.flushing = set()
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.evictions = 0
+        self.read_records = 0
+        self.written_bytes = 0
+
+    def contains(self, user_id):
+        return str(user_id) in self.users
+
+    def cached(self, user_id):
+        user_id = str(user_id)
+        with self.lock:
+            user_data = self.users.get(user_id)
+            if user_data is not None:
+                self.hits += 1
+                self.users.move_to_end(user_id)
+            return user_data
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        while True:
+            user_data = self.cached(user_id)
+            if user_data is not None:
+                return user_data
+            generation = self.generations.get(user_id, 0)
+            started = time.perf_counter()
+            loaded = self.backend.load_user(user_id)
+            latency("storage_read").observe(time.perf_counter() - started)
+            if loaded is not None:
+                self.read_records += user_size(loaded)
+                loaded = from_json(loaded)
+            if user_id in self.importing:
+                return loaded or new_history()
+            with self.lock:
+                if self.generations.get(user_id, 0) == generation:
+                    return self._attach(user_id, loaded)
+
+    def invalidate(self, user_id):
+        user_id = str(user_id)
+        with self.lock:
+            self.generations[user_id] = self.generations.get(user_id, 0) + 1
+            if user_id in self.users and user_id not in self.dirty and user_id not in self.flushing:
+                del self.users[user_id]
+                self.records -= self.sizes.pop(user_id)
+                self.aggregates.pop(user_id, None)
+                self.foods.pop(user_id, None)
+
+    def bulk_import(self, user_id, records):
+        """Stream ``(kind, record)`` pairs straight into the backend in one transaction.
+
+        Callers hold the user's write lock. Pending ops are flushed first so the
+        import lands after them; until it commits, cache misses for the user are
+        served uncached, and the cached copy is dropped afterwards.
+        """
+        user_id = str(user_id)
+        with self.lock:
+            self.importing.add(user_id)
+        try:
+            self.flush()
+            with self.flush_lock:
+                started = time.perf_counter()
+                try:
+                    return self.backend.extend(user_id, records)
+                finally:
+                    latency("storage_import").observe(time.perf_counter() - started)
+        finally:
+            with self.lock:
+                self.importing.discard(user_id)
+            self.invalidate(user_id)
+
+    def settings_with(self, keys):
+        self.flush()
+        with self.flush_lock:
+            return self.backend.settings_with(keys)
+
+    def load_sessions(self, since):
+        with self.flush_lock:
+            return self.backend.load_sessions(since)
+
+    def write_sessions(self, ops):
+        with self.flush_lock:
+            self.backend.write_sessions(ops, time.time())
+
+    def export(self, user_id, write):
+        self.flush()
+        segments = self.get(user_id)["archive"]
+        with self.flush_lock:
+            archived = chain.from_iterable(self.archive.read(user_id, s["segment"]) for s in segments)
+            return write(chain(archived, self.backend.iter_records(user_id)))
+
+    def user_ids_before(self, cutoff):
+        self.flush()
+        with self.flush_lock:
+            return self.backend.user_ids_before(cutoff)
+
+    def prepare_compaction(self, user_id, cutoff, dry_run=False):
+        """Plan moving the user's records dated before ``cutoff`` to an archive segment and write the segment.
+
+        Runs on the executor without holding the cache lock; callers hold the
+        user's write lock. Returns ``(user_data, lengths, plan)`` for
+        ``commit_compaction``; ``plan`` is None if there was nothing to move.
+        """
+        user_id = str(user_id)
+        user_data = self.get(user_id)
+        with self.lock:
+            user_data = self._attach(user_id, user_data)
+            lengths = log_lengths(user_data)
+        plan = plan_compaction(user_data, cutoff)
+        if plan is not None and not dry_run:
+            self.archive.write(user_id, plan.segment["segment"], plan.payload)
+        return user_data, lengths, plan
+
+    def commit_compaction(self, user_id, user_data, lengths, plan):
+        """Apply a prepared plan and queue its op, on the thread that owns history writes.
+
+        Returns False without changing anything if the cached history is no
+        longer the same object with the same lengths, so the caller plans again.
+        The cached aggregates and food catalog stay valid.
+        """
+        user_id = str(user_id)
+        with self.lock:
+            if self.users.get(user_id) is not user_data or log_lengths(user_data) != lengths:
+                return False
+            apply_compaction(user_data, plan)
+            self._resize(user_id, user_size(user_data))
+            self._queue(user_id, ("compact", user_id, plan.cutoff, plan.days, plan.segment))
+            return True
+
+    def archived(self, user_id, first, last, kinds=RAW_KINDS):
+        """Raw logs of ``kinds`` from the user's archive segments overlapping the dates ``first``..``last``."""
+        user_data = self.get(user_id)
+        records = {kind: [] for kind in kinds}
+        started = time.perf_counter()
+        for segment in user_data["archive"]:
+            if segment["first"] <= last.isoformat() and segment["last"] >= first.isoformat():
+                for kind, record in self.archive.read(user_id, segment["segment"], kinds):
+                    records[kind].append(record)
+        latency("archive_read").observe(time.perf_counter() - started)
+        return {kind: LOGS[kind].from_dicts(records[kind]) for kind in kinds}
+
+    def get_aggregates(self, user_id):
+        """Build the user's aggregates outside the cache lock; retry if the history changed meanwhile."""
+        user_id = str(user_id)
+        while True:
+            user_data = self.get(user_id)
+            with self.lock:
+                aggregates = self.aggregates.get(user_id)
+                if aggregates is not None:
+                    return aggregates
+                user_data = self._attach(user_id, user_data)
+                lengths = log_lengths(user_data)
+            aggregates = UserAggregates.from_history(user_data)
+            with self.lock:
+                if self.users.get(user_id) is user_data and log_lengths(user_data) == lengths:
+                    self.aggregates[user_id] = aggregates
+                    return aggregates
+
+    def get_foods(self, user_id):
+        """Build the user's food catalog outside the cache lock; retry if the meals changed meanwhile."""
+        user_id = str(user_id)
+        while True:
+            user_data = self.get(user_id)
+            with self.lock:
+                foods = self.foods.get(user_id)
+                if foods is not None:
+                    return foods
+                user_data = self._attach(user_id, user_data)
+                count = len(user_data["meals"])
+            foods = FoodCatalog.from_history(user_data)
+            with self.lock:
+                if self.users.get(user_id) is user_data and len(user_data["meals"]) == count:
+                    self.foods[user_id] = foods
+                    return foods
+
+    def append(self, user_id, kind, record, load=True):
+        """Append ``record``; with ``load=False`` a user who is not cached is left alone and None returned."""
+        user_id = str(user_id)
+        user_data = self.get(user_id) if load else None
+        with self.lock:
+            user_data = self._attach(user_id, user_data) if load else self.cached(user_id)
+            if user_data is None:
+                return None
+            micros = user_data[kind].append(record)
+            if user_id in self.aggregates:
+                self.aggregates[user_id].add(kind, micros, record)
+            if kind == "meals" and user_id in self.foods:
+                self.foods[user_id].add(record["name"], record["calories"], record.get("protein", 0), micros)
+            self._resize(user_id, self.sizes[user_id] + 1)
+            self._queue(user_id, ("append", user_id, kind, record))
+            return user_data
+
+    def save_settings(self, user_id, settings, load=True):
+        user_id = str(user_id)
+        user_data = self.get(user_id) if load else None
+        with self.lock:
+            user_data = self._attach(user_id, user_data) if load else self.cached(user_id)
+            if user_data is None:
+                return None
+            user_data["settings"] = settings
+            self._queue(user_id, ("settings", user_id, dict(settings)))
+            return user_data
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                ops, self.pending = self.pending, []
+                self.flushing, self.dirty = self.dirty, set()
+            try:
+                if ops:
+                    started = time.perf_counter()
+                    self.backend.write_batch(ops)
+                    latency("storage_write").observe(time.perf_counter() - started)
+                    self.flushes += 1
+                    self.flushed_ops += len(ops)
+                    self.written_bytes += len(json.dumps(ops, ensure_ascii=False).encode())
+            except Exception:
+                with self.lock:
+                    self.pending[:0] = ops
+                    self.dirty |= self.flushing
+                raise
+            finally:
+                with self.lock:
+                    self.flushing = set()
+                    self._evict()
+            return len(ops)
+
+    def close(self):
+        self.flush()
+        self.backend.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "users": len(self.users),
+                "records": self.records,
+                "pending_ops": len(self.pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "flushes": self.flushes,
+                "flushed_ops": self.flushed_ops,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / (self.hits + self.misses), 4) if self.hits + self.misses else 0.0,
+                "storage_read_records": self.read_records,
+                "storage_written_bytes": self.written_bytes,
+                "storage_file_bytes": self.backend.size(),
+            }
+
+    def _attach(self, user_id, user_data):
+        current = self.users.get(user_id)
+        if current is not None:
+            return current
+        self.misses += 1
+        if user_data is None:
+            user_data = new_history()
+            self._queue(user_id, ("user", user_id, to_json(user_data)))
+        self._store(user_id, user_data)
+        return user_data
+
+    def _queue(self, user_id, op):
+        self.pending.append(op)
+        self.dirty.add(user_id)
+
+    def _store(self, user_id, user_data):
+        self.users[user_id] = user_data
+        self.users.move_to_end(user_id)
+        self._resize(user_id, user_size(user_data))
+        self._evict(keep=user_id)
+
+    def _resize(self, user_id, size):
+        self.records += size - self.sizes.get(user_id, 0)
+        self.sizes[user_id] = size
+
+    def _evict(self, keep=None):
+        if len(self.users) <= self.max_users and self.records <= self.max_records:
+            return
+        for user_id in list(self.users):
+            if len(self.users) <= self.max_users and self.records <= self.max_records:
+                break
+            if user_id == keep or user_id in self.dirty or user_id in self.flushing:
+                continue
+            del self.users[user_id]
+            self.aggregates.pop(user_id, None)
+            self.foods.pop(user_id, None)
+            self.records -= self.sizes.pop(user_id)
+            self.evictions += 1
+
+class AsyncUserStore:
+    """Async front for a UserCache.
+
+    Cache hits are answered on the event loop; misses, flushes and closing run
+    on a bounded thread pool so disk I/O never blocks other users' updates.
+    Writes to cached users happen on the event loop; a user evicted before the
+    write is loaded on the pool first and the write retried.
+    ``lock(user_id)`` serializes one user's read-modify-write sequences.
+    """
+
+    def __init__(self, cache, max_workers=4):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+        self.locks = {}
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    @contextlib.asynccontextmanager
+    async def lock(self, user_id):
+        user_id = str(user_id)
+        entry = self.locks.get(user_id)
+        if entry is None:
+            entry = self.locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[user_id]
+
+    async def get(self, user_id):
+        user_data = self.cache.cached(user_id)
+        if user_data is not None:
+            return user_data
+        return await self._run(self.cache.get, user_id)
+
+    async def aggregates(self, user_id):
+        aggregates = self.cache.aggregates.get(str(user_id))
+        if aggregates is not None and self.cache.contains(user_id):
+            return aggregates
+        return await self._run(self.cache.get_aggregates, user_id)
+
+    async def foods(self, user_id):
+        foods = self.cache.foods.get(str(user_id))
+        if foods is not None and self.cache.contains(user_id):
+            return foods
+        return await self._run(self.cache.get_foods, user_id)
+
+    async def append(self, user_id, kind, record):
+        while True:
+            user_data = self.cache.append(user_id, kind, record, load=False)
+            if user_data is not None:
+                return user_data
+            await self._run(self.cache.get, user_id)
+
+    async def save_settings(self, user_id, settings):
+        while True:
+            user_data = self.cache.save_settings(user_id, settings, load=False)
+            if user_data is not None:
+                return user_data
+            await self._run(self.cache.get, user_id)
+
+    async def bulk_import(self, user_id, records):
+        return await self._run(self.cache.bulk_import, user_id, records)
+
+    async def export(self, user_id, write):
+        return await self._run(self.cache.export, user_id, write)
+
+    async def user_ids_before(self, cutoff):
+        return await self._run(self.cache.user_ids_before, cutoff)
+
+    async def compact(self, user_id, cutoff, dry_run=False):
+        """Plan on the executor, then apply on the event loop like ``append``; returns the plan or None."""
+        while True:
+            user_data, lengths, plan = await self._run(self.cache.prepare_compaction, user_id, cutoff, dry_run)
+            if plan is None or dry_run or self.cache.commit_compaction(user_id, user_data, lengths, plan):
+                return plan
+
+    async def archived(self, user_id, first, last, kinds=RAW_KINDS):
+        return await self._run(self.cache.archived, user_id, first, last, kinds)
+
+    async def settings_with(self, keys):
+        return await self._run(self.cache.settings_with, keys)
+
+    async def load_sessions(self, since):
+        return await self._run(self.cache.load_sessions, since)
+
+    async def write_sessions(self, ops):
+        return await self._run(self.cache.write_sessions, ops)
+
+    async def flush(self):
+        return await self._run(self.cache.flush)
+
+    async def close(self):
+        await self._run(self.cache.close)
+        self.executor.shutdown()
+
+    def stats(self):
+        return dict(self.cache.stats(), locked_users=len(self.locks))
@@ -0,0 +1,115 @@
+"""
+🥗 קטלוג מאכלים אישי עם השלמה אוטומטית
+"""
+
+import heapq
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain
+
+MIN_SIMILARITY = 0.3
+MAX_CHAR = "\U0010ffff"
+
+def normalize(name):
+    return " ".join(str(name).casefold().split())
+
+def trigrams(key):
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class Food:
+    __slots__ = ("name", "calories", "protein", "count", "last", "grams")
+
+    def __init__(self, name, grams):
+        self.name = name
+        self.calories = 0
+        self.protein = 0
+        self.count = 0
+        self.last = -1
+        self.grams = grams
+
+class FoodCatalog:
+    """A user's distinct meal names with their latest calories/protein.
+
+    ``prefixes`` is a sorted list of ``(suffix, key)`` pairs, one per word
+    start of each name, so a prefix of any word is a bisect away. ``grams`` maps
+    each trigram to the names containing it and backs the fuzzy fallback for
+    typos. Both are updated in place as meals are logged.
+    """
+
+    def __init__(self):
+        self.foods = {}
+        self.prefixes = []
+        self.grams = {}
+
+    @classmethod
+    def from_history(cls, history):
+        catalog = cls()
+        for segment in history["archive"]:
+            for name, calories, protein, count, micros in segment["foods"]:
+                catalog.add(name, calories, protein, micros, index=False, count=count)
+        meals = history["meals"]
+        columns = zip(meals.timestamps, meals.column("name"), meals.column("calories"), meals.column("protein"))
+        for micros, name, calories, protein in columns:
+            catalog.add(name, calories, protein, micros, index=False)
+        catalog.prefixes.sort()
+        return catalog
+
+    def __len__(self):
+        return len(self.foods)
+
+    def add(self, name, calories, protein, micros, index=True, count=1):
+        key = normalize(name)
+        if not key:
+            return
+        food = self.foods.get(key)
+        if food is None:
+            food = self.foods[key] = Food(name, trigrams(key))
+            self._index(key, food, index)
+        food.count += count
+        if micros >= food.last:
+            food.name, food.calories, food.protein, food.last = name, calories, protein, micros
+
+    def _index(self, key, food, sort):
+        words = key.split(" ")
+        for i in range(len(words)):
+            entry = (" ".join(words[i:]), key)
+            if sort:
+                insort(self.prefixes, entry)
+            else:
+                self.prefixes.append(entry)
+        for gram in food.grams:
+            keys = self.grams.get(gram)
+            if keys is None:
+                keys = self.grams[gram] = set()
+            keys.add(key)
+
+    def get(self, name):
+        return self.foods.get(normalize(name))
+
+    def search(self, query, limit=5):
+        """Return up to ``limit`` foods matching ``query``: word prefixes first, then close spellings."""
+        key = normalize(query)
+        if not key:
+            return []
+        scores = {}
+        prefixes = self.prefixes
+        start = bisect_left(prefixes, (key,))
+        end = bisect_left(prefixes, (key + MAX_CHAR,), start)
+        for term, food_key in prefixes[start:end]:
+            if term == food_key:
+                scores[food_key] = 2.0
+            elif food_key not in scores:
+                scores[food_key] = 1.5
+        if len(scores) < limit:
+            grams = trigrams(key)
+            shared = Counter(chain.from_iterable(self.grams.get(gram, ()) for gram in grams))
+            for food_key, count in shared.items():
+                if food_key in scores:
+                    continue
+                similarity = count / (len(grams) + len(self.foods[food_key].grams) - count)
+                if similarity >= MIN_SIMILARITY:
+                    scores[food_key] = similarity
+        foods = self.foods
+        best = heapq.nlargest(limit, scores, key=lambda k: (scores[k], foods[k].count, foods[k].last))
+        return [foods[k] for k in best]
@@ -0,0 +1,190 @@
+"""
+🗂️ ייצוג עמודתי וחסכוני של היסטוריית המשתמש
+"""
+
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from storage import DEFAULT_SETTINGS
+
+EPOCH = datetime(1970, 1, 1)
+DAY = 86400 * 10**6
+
+def to_micros(when):
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    delta = when - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+
+def from_micros(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+def day_number(date):
+    return (date - EPOCH.date()).days
+
+class Record:
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()})"
+
+class Meal(Record):
+    __slots__ = ("name", "calories", "protein", "date")
+
+    def __init__(self, name, calories, protein, date):
+        self.name, self.calories, self.protein, self.date = name, calories, protein, date
+
+class Workout(Record):
+    __slots__ = ("type", "duration", "date")
+
+    def __init__(self, type, duration, date):
+        self.type, self.duration, self.date = type, duration, date
+
+class Weight(Record):
+    __slots__ = ("value", "date")
+
+    def __init__(self, value, date):
+        self.value, self.date = value, date
+
+class DaySummary(Record):
+    __slots__ = ("calories", "protein", "meal_count", "workout_minutes", "workout_count", "weight", "date")
+
+    def __init__(self, calories, protein, meal_count, workout_minutes, workout_count, weight, date):
+        self.calories, self.protein, self.meal_count = calories, protein, meal_count
+        self.workout_minutes, self.workout_count = workout_minutes, workout_count
+        self.weight, self.date = weight, date
+
+class Log:
+    """Records of one kind as parallel columns, kept sorted by timestamp.
+
+    Timestamps are microseconds since 1970-01-01 in the same naive local time
+    the ISO strings use, so window filters are ``bisect`` calls. Text columns are
+    interned lists; numeric columns are ``array``s.
+    """
+
+    record = None
+    columns = ()
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.data = [array(code) if code else [] for _, code, _ in self.columns]
+
+    @classmethod
+    def from_dicts(cls, records):
+        log = cls()
+        for micros, record in sorted(((to_micros(r["date"]), r) for r in records), key=lambda pair: pair[0]):
+            log.append(record, micros)
+        return log
+
+    def append(self, record, micros=None):
+        if micros is None:
+            micros = to_micros(record["date"])
+        index = len(self.timestamps)
+        if index and micros < self.timestamps[-1]:
+            index = bisect_right(self.timestamps, micros)
+        self.timestamps.insert(index, micros)
+        for (field, code, default), column in zip(self.columns, self.data):
+            value = record.get(field, default)
+            column.insert(index, sys.intern(value) if code is None else value)
+        return micros
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("log index out of range")
+        return self.record(
+            *(column[index] for column in self.data),
+            from_micros(self.timestamps[index]).isoformat()
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def drop(self, count):
+        """Remove the ``count`` oldest records."""
+        del self.timestamps[:count]
+        for column in self.data:
+            del column[:count]
+
+    def span(self, start=None, end=None):
+        """Indices of records with ``start < timestamp < end`` (micros, either bound optional)."""
+        lo = 0 if start is None else bisect_right(self.timestamps, start)
+        hi = len(self) if end is None else bisect_left(self.timestamps, end)
+        return range(lo, max(lo, hi))
+
+    def column(self, field):
+        return self.data[[c[0] for c in self.columns].index(field)]
+
+    def to_dicts(self):
+        return [record.to_dict() for record in self]
+
+class MealLog(Log):
+    record = Meal
+    columns = (("name", None, ""), ("calories", 'q', 0), ("protein", 'q', 0))
+
+class WorkoutLog(Log):
+    record = Workout
+    columns = (("type", None, ""), ("duration", 'q', 0))
+
+class WeightLog(Log):
+    record = Weight
+    columns = (("value", 'd', 0.0),)
+
+class DayLog(Log):
+    """Daily totals of compacted history; ``weight`` is the day's last weigh-in, 0 if none."""
+
+    record = DaySummary
+    columns = (
+        ("calories", 'q', 0), ("protein", 'q', 0), ("meal_count", 'q', 0),
+        ("workout_minutes", 'q', 0), ("workout_count", 'q', 0), ("weight", 'd', 0.0),
+    )
+
+RAW_KINDS = ("meals", "workouts", "weights")
+
+LOGS = {
+    "meals": MealLog,
+    "workouts": WorkoutLog,
+    "weights": WeightLog,
+    "days": DayLog,
+}
+
+def new_history():
+    return from_json({"settings": dict(DEFAULT_SETTINGS)})
+
+def from_json(user_data):
+    history = {kind: log.from_dicts(user_data.get(kind, ())) for kind, log in LOGS.items()}
+    history["settings"] = dict(user_data.get("settings", DEFAULT_SETTINGS))
+    history["archive"] = [dict(segment) for segment in user_data.get("archive", ())]
+    return history
+
+def to_json(history):
+    user_data = {kind: history[kind].to_dicts() for kind in LOGS}
+    user_data["settings"] = dict(history["settings"])
+    user_data["archive"] = [dict(segment) for segment in history["archive"]]
+    return user_data
@@ -0,0 +1,170 @@
+"""
+⏱️ מדדי זמני תגובה, Prometheus ופרופיילר דגימה
+"""
+
+import asyncio
+import functools
+import json
+import os
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from telegram.ext import ConversationHandler
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Latency:
+    """Fixed-bucket latency histogram: O(1) per observation, no per-sample storage."""
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+LATENCIES = {}
+
+def latency(name):
+    stats = LATENCIES.get(name)
+    if stats is None:
+        stats = LATENCIES[name] = Latency()
+    return stats
+
+def latency_stats():
+    return {name: stats.snapshot() for name, stats in sorted(LATENCIES.items())}
+
+def timed(callback, name=None):
+    stats = latency(name or callback.__name__)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            stats.observe(time.perf_counter() - started)
+
+    wrapper.timed = True
+    return wrapper
+
+TIMED_CODE = next(const for const in timed.__code__.co_consts if getattr(const, "co_name", None) == "wrapper")
+
+def _instrument(handler, wrapped):
+    if isinstance(handler, ConversationHandler):
+        nested = handler.entry_points + handler.fallbacks
+        for handlers in handler.states.values():
+            nested += handlers
+        for inner in nested:
+            _instrument(inner, wrapped)
+        return
+    callback = handler.callback
+    if getattr(callback, "timed", False):
+        return
+    if callback not in wrapped:
+        wrapped[callback] = timed(callback)
+    handler.callback = wrapped[callback]
+
+def instrument_handlers(app):
+    """Wrap every registered callback, including conversation states, with a ``timed`` wrapper."""
+    wrapped = {}
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            _instrument(handler, wrapped)
+
+def _flatten(stats, prefix=""):
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{name}_")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{name}", value
+
+def render_prometheus(stats, namespace="fitness"):
+    """Prometheus text format: every numeric stat as a gauge plus one histogram per ``Latency``."""
+    lines = []
+    for name, value in _flatten({k: v for k, v in stats.items() if k != "handlers"}):
+        lines.append(f"# TYPE {namespace}_{name} gauge")
+        lines.append(f"{namespace}_{name} {value}")
+    family = f"{namespace}_latency_seconds"
+    lines.append(f"# TYPE {family} histogram")
+    for name, stats in sorted(LATENCIES.items()):
+        seen = 0
+        for bound, count in zip(BUCKETS, stats.buckets):
+            seen += count
+            lines.append(f'{family}_bucket{{name="{name}",le="{bound}"}} {seen}')
+        lines.append(f'{family}_bucket{{name="{name}",le="+Inf"}} {stats.count}')
+        lines.append(f'{family}_sum{{name="{name}"}} {stats.total}')
+        lines.append(f'{family}_count{{name="{name}"}} {stats.count}')
+    return "\n".join(lines) + "\n"
+
+async def watch_event_loop(interval=0.5):
+    """Record how late the loop wakes up from a fixed sleep as ``event_loop_lag``."""
+    loop = asyncio.get_running_loop()
+    stats = latency("event_loop_lag")
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        stats.observe(max(0.0, loop.time() - started - interval))
+
+async def log_loop(stats, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(json.dumps({"ts": round(time.time(), 3), "event": "metrics", **stats()}, ensure_ascii=False), flush=True)
+
+def _frame_name(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def profile_handlers(thread_id, seconds, interval=0.005):
+    """Sample ``thread_id`` every ``interval`` for ``seconds``, keeping only stacks inside a ``timed`` handler.
+
+    Returns a Counter of folded stacks (``handler;callee;...``), the input
+    format of flame graph tools. Nothing runs outside the window.
+    """
+    samples = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            if code is TIMED_CODE:
+                if stack:
+                    samples[";".join(reversed(stack))] += 1
+                break
+            stack.append(_frame_name(code))
+            frame = frame.f_back
+        time.sleep(interval)
+    return samples
+
+def format_profile(samples):
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
@@ -0,0 +1,115 @@
+"""
+💾 שמירת מצב שיחות בין הפעלות מחדש
+"""
+
+import asyncio
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+class StorePersistence(BasePersistence):
+    """PTB persistence for ConversationHandler states and ``context.user_data``.
+
+    Rows live in the same backend as the user history. Only users in the middle
+    of a flow have rows: ending a conversation or emptying ``user_data`` deletes
+    them, and rows untouched for ``ttl`` seconds are pruned when loading, so
+    startup reads the in-flight sessions rather than every user. Updates are
+    coalesced for ``debounce`` seconds and written as one batch off the event
+    loop.
+
+    Sessions are read once and then served from memory, like the user cache
+    in front of the store, so a single bot process must own the database:
+    replicas sharing one store would see each other's sessions and history
+    stale, and are not supported.
+    """
+
+    def __init__(self, store, update_interval=5, debounce=1.0, ttl=86400):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.store = store
+        self.debounce = debounce
+        self.ttl = ttl
+        self.sessions = None
+        self.pending = {}
+        self.flush_task = None
+
+    async def _sessions(self):
+        if self.sessions is None:
+            self.sessions = await self.store.load_sessions(time.time() - self.ttl)
+        return self.sessions
+
+    async def get_user_data(self):
+        return (await self._sessions())["user_data"]
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return (await self._sessions())["conversations"].get(name, {})
+
+    async def update_conversation(self, name, key, new_state):
+        self._queue(("conversation", name, tuple(key)), new_state)
+
+    async def update_user_data(self, user_id, data):
+        self._queue(("user_data", user_id), dict(data) or None)
+
+    async def drop_user_data(self, user_id):
+        self._queue(("user_data", user_id), None)
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    def _queue(self, key, value):
+        self.pending[key] = value
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._debounced())
+
+    async def _debounced(self):
+        await asyncio.sleep(self.debounce)
+        self.flush_task = None
+        try:
+            await self._write()
+        except Exception as e:
+            print(f"⚠️ שגיאה בשמירת מצב שיחות: {e}")
+
+    async def _write(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        try:
+            await self.store.write_sessions([(*key, value) for key, value in pending.items()])
+        except Exception:
+            self.pending = {**pending, **self.pending}
+            raise
+
+    async def flush(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        await self._write()
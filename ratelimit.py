@@ -0,0 +1,190 @@
+"""
+🚦 בקרת קצב לשליחת הודעות ל-Telegram
+"""
+
+import asyncio
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import latency
+
+INTERACTIVE, BULK = 0, 1
+LANES = ("interactive", "bulk")
+LIMITED_ENDPOINTS = ("send", "edit", "copyMessage", "forwardMessage")
+
+class TokenBucket:
+    """Token bucket that hands tokens to waiting lanes in order, lane 0 first."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "lanes", "timer")
+
+    def __init__(self, rate, burst, lanes=len(LANES)):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lanes = tuple(deque() for _ in range(lanes))
+        self.timer = None
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def idle(self):
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst and not any(self.lanes)
+
+    def pause(self, seconds):
+        """Empty the bucket and start refilling it only ``seconds`` from now."""
+        until = time.monotonic() + seconds
+        if until > self.updated:
+            self.tokens = 0
+            self.updated = until
+
+    async def acquire(self, lane=INTERACTIVE, first=False):
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1 and not any(self.lanes[:lane + 1]):
+            self.tokens -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        if first:
+            self.lanes[lane].appendleft(waiter)
+        else:
+            self.lanes[lane].append(waiter)
+        self._schedule(now)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.tokens += 1
+            raise
+
+    def _schedule(self, now):
+        if self.timer is None:
+            delay = max(self.updated - now, 0) + max(1 - self.tokens, 0) / self.rate
+            self.timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self.timer = None
+        now = time.monotonic()
+        self._refill(now)
+        for lane in self.lanes:
+            while lane and self.tokens >= 1:
+                waiter = lane.popleft()
+                if not waiter.done():
+                    self.tokens -= 1
+                    waiter.set_result(None)
+        if any(self.lanes):
+            self._schedule(now)
+
+class OutboundLimiter(BaseRateLimiter):
+    """Paces sends and edits with a global token bucket plus one bucket per chat.
+
+    Interactive replies go ahead of bulk sends (``rate_limit_args=BULK``) in
+    both buckets. On a 429 the global bucket is paused for ``retry_after`` and
+    the request retried at the head of its lane. An edit of a message that already has an edit
+    waiting replaces that edit's payload and shares its result, so rapid
+    edits cost one API call. Other endpoints pass straight through.
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3, group_rate=20 / 60, max_retries=3, max_chats=10000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self.chats = {}
+        self.edits = {}
+        self.waiting = [0] * len(LANES)
+        self.sent = 0
+        self.retries = 0
+        self.coalesced = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat(self, chat_id):
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if len(self.chats) >= self.max_chats:
+                for key in [key for key, chat in self.chats.items() if chat.idle()]:
+                    del self.chats[key]
+            group = not isinstance(chat_id, int) or chat_id < 0
+            bucket = self.chats[chat_id] = TokenBucket(self.group_rate if group else self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if not endpoint.startswith(LIMITED_ENDPOINTS):
+            return await callback(*args, **kwargs)
+        lane = BULK if rate_limit_args == BULK else INTERACTIVE
+        chat_id = data.get("chat_id")
+        key = None
+        if endpoint.startswith("edit"):
+            key = (endpoint, chat_id, data.get("message_id"), data.get("inline_message_id"))
+            pending = self.edits.get(key)
+            if pending is not None:
+                pending[0] = (callback, args, kwargs)
+                if pending[1] is None:
+                    pending[1] = asyncio.get_running_loop().create_future()
+                self.coalesced += 1
+                return await asyncio.shield(pending[1])
+            pending = self.edits[key] = [(callback, args, kwargs), None]
+
+        queued = time.monotonic()
+        self.waiting[lane] += 1
+        try:
+            try:
+                if chat_id is not None:
+                    await self._chat(chat_id).acquire(lane)
+                await self.global_bucket.acquire(lane)
+            finally:
+                self.waiting[lane] -= 1
+            latency(f"outbound_wait_{LANES[lane]}").observe(time.monotonic() - queued)
+            if key is not None:
+                del self.edits[key]
+                callback, args, kwargs = pending[0]
+            result = await self._send(callback, args, kwargs, lane)
+        except BaseException as e:
+            if key is not None:
+                if self.edits.get(key) is pending:
+                    del self.edits[key]
+                if pending[1] is not None and not pending[1].done():
+                    if isinstance(e, asyncio.CancelledError):
+                        pending[1].cancel()
+                    else:
+                        pending[1].set_exception(e)
+            raise
+        if key is not None and pending[1] is not None:
+            pending[1].set_result(result)
+        return result
+
+    async def _send(self, callback, args, kwargs, lane):
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                self.global_bucket.pause(e.retry_after)
+                await self.global_bucket.acquire(lane, first=True)
+
+    def stats(self):
+        return {
+            "outbound_sent": self.sent,
+            "outbound_retries": self.retries,
+            "outbound_coalesced": self.coalesced,
+            "outbound_waiting_interactive": self.waiting[INTERACTIVE],
+            "outbound_waiting_bulk": self.waiting[BULK],
+            "outbound_chats": len(self.chats),
+        }
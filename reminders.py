@@ -0,0 +1,195 @@
+"""
+⏰ תזכורות וסיכום יומי בקבוצות זמן
+"""
+
+import asyncio
+from datetime import datetime, time as dtime
+
+from telegram.error import Forbidden, RetryAfter
+
+from metrics import latency
+from ratelimit import BULK
+
+SETTINGS = {"digest": "digest_time", "lunch": "lunch_reminder"}
+LUNCH_FROM = dtime(11, 0)
+MINUTES_PER_DAY = 24 * 60
+
+def parse_time(text):
+    hours, minutes = text.strip().split(":")
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(text)
+    return hours * 60 + minutes
+
+def format_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+class ReminderScheduler:
+    """Sends opt-in daily digests and lunch reminders from one repeating job.
+
+    Subscriptions are grouped into ``bucket_minutes`` wide buckets of the day,
+    so a single ``tick`` per bucket hands every due user to a queue instead of
+    one timer per user. A single sender task drains the queue at ``rate``
+    messages per second through the outbound limiter's bulk lane, rendering
+    each message from the cached per-day aggregates just before sending, so a
+    large bucket never delays interactive updates or trips Telegram's global
+    limit. ``clock`` and ``sleep`` can be replaced to drive it with a fake
+    clock.
+    """
+
+    def __init__(self, store, render_digest, texts, bucket_minutes=5, rate=25,
+                 max_catch_up=3, clock=datetime.now, sleep=asyncio.sleep):
+        if bucket_minutes <= 0 or MINUTES_PER_DAY % bucket_minutes:
+            raise ValueError(f"bucket_minutes must divide {MINUTES_PER_DAY}")
+        self.store = store
+        self.render_digest = render_digest
+        self.texts = texts
+        self.bucket_minutes = bucket_minutes
+        self.buckets_per_day = MINUTES_PER_DAY // bucket_minutes
+        self.interval = 1 / rate
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.sleep = sleep
+        self.buckets = {}
+        self.subscriptions = {}
+        self.queue = asyncio.Queue()
+        self.last_bucket = None
+        self.bot = None
+        self.send_args = {}
+        self.task = None
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def bucket_of(self, minutes):
+        return minutes // self.bucket_minutes
+
+    def add(self, user_id, kind, minutes):
+        """Schedule ``kind`` for ``user_id`` and return the bucket start it was rounded down to, in minutes."""
+        self.discard(user_id, kind)
+        bucket = self.bucket_of(minutes)
+        self.buckets.setdefault(bucket, {}).setdefault(kind, set()).add(str(user_id))
+        self.subscriptions[(str(user_id), kind)] = bucket
+        return bucket * self.bucket_minutes
+
+    def discard(self, user_id, kind):
+        bucket = self.subscriptions.pop((str(user_id), kind), None)
+        if bucket is not None:
+            self.buckets[bucket][kind].discard(str(user_id))
+
+    def scheduled(self, user_id, kind):
+        bucket = self.subscriptions.get((str(user_id), kind))
+        return None if bucket is None else bucket * self.bucket_minutes
+
+    async def load(self):
+        subscribers = await self.store.settings_with(tuple(SETTINGS.values()))
+        for user_id, settings in subscribers.items():
+            for kind, key in SETTINGS.items():
+                if settings.get(key) is not None:
+                    self.add(user_id, kind, parse_time(settings[key]))
+        return len(subscribers)
+
+    async def subscribe(self, user_id, kind, minutes):
+        if minutes is None:
+            self.discard(user_id, kind)
+            value = None
+        else:
+            value = format_time(self.add(user_id, kind, minutes))
+        async with self.store.lock(user_id):
+            user_data = await self.store.get(user_id)
+            settings = dict(user_data["settings"])
+            if value is None:
+                settings.pop(SETTINGS[kind], None)
+            else:
+                settings[SETTINGS[kind]] = value
+            await self.store.save_settings(user_id, settings)
+        return value
+
+    def next_delay(self):
+        """Seconds until the next bucket boundary, for the first run of the repeating job."""
+        now = self.clock()
+        into_bucket = (now.hour * 60 + now.minute) % self.bucket_minutes * 60 + now.second + now.microsecond / 1e6
+        return self.bucket_minutes * 60 - into_bucket
+
+    def due_buckets(self, now):
+        current = self.bucket_of(now.hour * 60 + now.minute)
+        if self.last_bucket is None:
+            missed = 1
+        else:
+            missed = min((current - self.last_bucket) % self.buckets_per_day, self.max_catch_up)
+        self.last_bucket = current
+        return [(current - i) % self.buckets_per_day for i in reversed(range(missed))]
+
+    async def tick(self, context=None):
+        """JobQueue callback: queue every subscription in the buckets that came due since the last tick."""
+        now = self.clock()
+        queued = 0
+        for bucket in self.due_buckets(now):
+            for kind, users in self.buckets.get(bucket, {}).items():
+                for user_id in list(users):
+                    self.queue.put_nowait((user_id, kind, now.date(), now))
+                    queued += 1
+        return queued
+
+    def start(self, bot):
+        self.bot = bot
+        self.send_args = {"rate_limit_args": BULK} if getattr(bot, "rate_limiter", None) else {}
+        if self.task is None:
+            self.task = asyncio.create_task(self._send_loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def drain(self):
+        """Wait until every queued message was handled."""
+        await self.queue.join()
+
+    async def _send_loop(self):
+        while True:
+            user_id, kind, day, queued = await self.queue.get()
+            try:
+                latency("reminder_queue_wait").observe((self.clock() - queued).total_seconds())
+                await self._deliver(user_id, kind, day)
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️ שגיאה בשליחת תזכורת ל-{user_id}: {e}")
+            finally:
+                self.queue.task_done()
+            await self.sleep(self.interval)
+
+    async def _render(self, user_id, kind, day):
+        aggregates = await self.store.aggregates(user_id)
+        if kind == "lunch":
+            if aggregates.since(datetime.combine(day, LUNCH_FROM), end=self.clock()).meal_count:
+                return None
+            return self.texts.lunch_reminder
+        return self.render_digest(await self.store.get(user_id), aggregates, day)
+
+    async def _deliver(self, user_id, kind, day):
+        text = await self._render(user_id, kind, day)
+        if text is None:
+            self.skipped += 1
+            return
+        while True:
+            try:
+                await self.bot.send_message(int(user_id), text, parse_mode='Markdown', **self.send_args)
+                self.sent += 1
+                return
+            except RetryAfter as e:
+                await self.sleep(e.retry_after)
+            except Forbidden:
+                self.skipped += 1
+                for other in SETTINGS:
+                    await self.subscribe(user_id, other, None)
+                return
+
+    def stats(self):
+        return {
+            "reminder_subscriptions": len(self.subscriptions),
+            "reminders_queued": self.queue.qsize(),
+            "reminders_sent": self.sent,
+            "reminders_skipped": self.skipped,
+            "reminders_failed": self.failed,
+        }
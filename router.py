@@ -0,0 +1,36 @@
+"""
+🧭 ניתוב הודעות טקסט חופשי לפי טבלה
+"""
+
+class TextRouter:
+    """Maps free text to a handler with dict lookups instead of a chain of comparisons.
+
+    Exact routes (menu buttons, shortcuts) are one lookup on the whole text.
+    Prefix routes are grouped by prefix length, so a message costs one slice and
+    lookup per distinct length, longest first, however many prefixes share it.
+    """
+
+    __slots__ = ("exact", "prefixes", "lengths")
+
+    def __init__(self):
+        self.exact = {}
+        self.prefixes = {}
+        self.lengths = ()
+
+    def add_exact(self, text, callback):
+        self.exact[text] = callback
+
+    def add_prefix(self, prefix, callback):
+        self.prefixes[prefix] = callback
+        self.lengths = tuple(sorted({len(p) for p in self.prefixes}, reverse=True))
+
+    def match(self, text):
+        callback = self.exact.get(text)
+        if callback is not None:
+            return callback
+        prefixes = self.prefixes
+        for length in self.lengths:
+            callback = prefixes.get(text[:length])
+            if callback is not None:
+                return callback
+        return None
@@ -0,0 +1,99 @@
+"""
+🚦 עיבוד עדכונים במקביל עם שמירת סדר לכל משתמש
+"""
+
+import asyncio
+import time
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import latency
+
+UNBOUNDED = 2**31 - 1
+
+def update_key(update):
+    if isinstance(update, Update):
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+    return None
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Runs updates from different users concurrently, one at a time per user.
+
+    PTB's own semaphore is left unbounded so every update reaches
+    ``do_process_update`` in arrival order and takes its place in its user's
+    FIFO lock before any ``await``; only then does it wait for one of
+    ``max_concurrent_updates`` slots. A busy user therefore never holds more
+    than one slot, and the ConversationHandler steps of one user cannot overtake
+    each other.
+    """
+
+    __slots__ = ("limit", "slots", "locks", "waiting", "active", "processed")
+
+    def __init__(self, max_concurrent_updates):
+        self.limit = max_concurrent_updates
+        super().__init__(UNBOUNDED)
+        self.slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self.locks = {}
+        self.waiting = 0
+        self.active = 0
+        self.processed = 0
+
+    @property
+    def max_concurrent_updates(self):
+        return self.limit
+
+    async def do_process_update(self, update, coroutine):
+        key = update_key(update)
+        queued = time.perf_counter()
+        entry = None
+        if key is not None:
+            entry = self.locks.get(key)
+            if entry is None:
+                entry = self.locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+        self.waiting += 1
+        waiting = True
+        try:
+            if entry is not None:
+                await entry[0].acquire()
+            try:
+                async with self.slots:
+                    self.waiting -= 1
+                    waiting = False
+                    self.active += 1
+                    started = time.perf_counter()
+                    latency("update_queue_wait").observe(started - queued)
+                    try:
+                        await coroutine
+                    finally:
+                        self.active -= 1
+                        self.processed += 1
+                        latency("update").observe(time.perf_counter() - started)
+            finally:
+                if entry is not None:
+                    entry[0].release()
+        finally:
+            if waiting:
+                self.waiting -= 1
+            if entry is not None:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self):
+        return {
+            "updates_waiting": self.waiting,
+            "updates_active": self.active,
+            "updates_processed": self.processed,
+            "users_in_flight": len(self.locks),
+        }
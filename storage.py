@@ -0,0 +1,462 @@
+"""
+💾 שכבת אחסון לנתוני המשתמשים
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+DEFAULT_SETTINGS = {"target_calories": 2000, "target_protein": 150}
+
+FIELDS = {
+    "meals": ("name", "calories", "protein", "date"),
+    "workouts": ("type", "duration", "date"),
+    "weights": ("value", "date"),
+}
+DAY_FIELDS = ("calories", "protein", "meal_count", "workout_minutes", "workout_count", "weight", "date")
+ARCHIVE_FIELDS = ("segment", "first", "last", "records", "bytes", "foods")
+
+def new_sessions():
+    return {"conversations": {}, "user_data": {}}
+
+def new_user():
+    return {
+        "meals": [],
+        "workouts": [],
+        "weights": [],
+        "days": [],
+        "archive": [],
+        "settings": dict(DEFAULT_SETTINGS)
+    }
+
+def compact_user(user_data, cutoff, days, segment):
+    """Drop records dated before ``cutoff``, upsert their day summaries and list the archive segment holding them."""
+    for kind in FIELDS:
+        user_data[kind] = [record for record in user_data.get(kind, []) if record["date"] >= cutoff]
+    merged = {record["date"]: record for record in user_data.get("days", [])}
+    merged.update((record["date"], record) for record in days)
+    user_data["days"] = sorted(merged.values(), key=lambda record: record["date"])
+    user_data["archive"] = user_data.get("archive", []) + [segment]
+
+def fsync_dir(directory):
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write(path, write, binary=False):
+    """Call ``write`` on a temp file next to ``path``, fsync it and rename it into place."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    fsync_dir(directory)
+
+def atomic_write_json(path, data, **kwargs):
+    atomic_write(path, lambda f: json.dump(data, f, ensure_ascii=False, **kwargs))
+
+class JsonStorage:
+    """The original single-document backend: every write rewrites the whole file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.sessions_path = os.path.splitext(path)[0] + ".state.json"
+
+    def load_all(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def save_all(self, data):
+        atomic_write_json(self.path, data, indent=2)
+
+    def user_ids_before(self, cutoff):
+        return [
+            user_id for user_id, user_data in self.load_all().items()
+            if any(record["date"] < cutoff for kind in FIELDS for record in user_data.get(kind, []))
+        ]
+
+    def size(self):
+        return sum(os.path.getsize(p) for p in (self.path, self.sessions_path) if os.path.exists(p))
+
+    def settings_with(self, keys):
+        return {
+            user_id: user_data["settings"] for user_id, user_data in self.load_all().items()
+            if any(user_data["settings"].get(key) is not None for key in keys)
+        }
+
+    def load_user(self, user_id):
+        """The user's record with any kind it predates (``days``, ``archive``) filled in empty."""
+        user_data = self.load_all().get(str(user_id))
+        return None if user_data is None else dict(new_user(), **user_data)
+
+    def write_batch(self, ops):
+        data = self.load_all()
+        for op, user_id, *args in ops:
+            user_id = str(user_id)
+            if op == "user":
+                data[user_id] = args[0]
+            elif op == "append":
+                data.setdefault(user_id, new_user())[args[0]].append(args[1])
+            elif op == "settings":
+                data.setdefault(user_id, new_user())["settings"] = args[0]
+            elif op == "compact":
+                compact_user(data.setdefault(user_id, new_user()), *args)
+        self.save_all(data)
+
+    def extend(self, user_id, records):
+        data = self.load_all()
+        user_data = data.setdefault(str(user_id), new_user())
+        count = 0
+        for kind, record in records:
+            user_data[kind].append(record)
+            count += 1
+        self.save_all(data)
+        return count
+
+    def iter_records(self, user_id):
+        user_data = self.load_user(user_id) or new_user()
+        for kind in FIELDS:
+            for record in user_data[kind]:
+                yield kind, record
+
+    def _load_session_rows(self):
+        if os.path.exists(self.sessions_path):
+            with open(self.sessions_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return new_sessions()
+
+    def load_sessions(self, since):
+        rows = self._load_session_rows()
+        sessions = new_sessions()
+        for name, entries in rows["conversations"].items():
+            for key, (state, updated) in entries.items():
+                if updated >= since:
+                    sessions["conversations"].setdefault(name, {})[tuple(json.loads(key))] = state
+        for user_id, (data, updated) in rows["user_data"].items():
+            if updated >= since:
+                sessions["user_data"][int(user_id)] = data
+        return sessions
+
+    def write_sessions(self, ops, now):
+        rows = self._load_session_rows()
+        for op, *args in ops:
+            if op == "conversation":
+                name, key, state = args
+                entries = rows["conversations"].setdefault(name, {})
+                key = json.dumps(list(key))
+                if state is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = [state, now]
+            elif op == "user_data":
+                user_id, data = args
+                if data:
+                    rows["user_data"][str(user_id)] = [data, now]
+                else:
+                    rows["user_data"].pop(str(user_id), None)
+        atomic_write_json(self.sessions_path, rows)
+
+    def close(self):
+        pass
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meals (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    calories INTEGER NOT NULL,
+    protein INTEGER NOT NULL DEFAULT 0,
+    date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workouts (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS weights (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    value REAL NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS meals_user_date ON meals (user_id, date);
+CREATE INDEX IF NOT EXISTS workouts_user_date ON workouts (user_id, date);
+CREATE INDEX IF NOT EXISTS weights_user_date ON weights (user_id, date);
+CREATE TABLE IF NOT EXISTS days (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    calories INTEGER NOT NULL,
+    protein INTEGER NOT NULL,
+    meal_count INTEGER NOT NULL,
+    workout_minutes INTEGER NOT NULL,
+    workout_count INTEGER NOT NULL,
+    weight REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date)
+);
+CREATE TABLE IF NOT EXISTS archives (
+    user_id TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    first TEXT NOT NULL,
+    last TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    foods TEXT NOT NULL,
+    PRIMARY KEY (user_id, segment)
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE TABLE IF NOT EXISTS user_state (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+class SqliteStorage:
+    """One row per user plus one row per logged record, so a write only touches that record."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def user_ids_before(self, cutoff):
+        """Users with any record dated before ``cutoff``."""
+        query = " UNION ".join(f"SELECT user_id FROM {kind} WHERE date < ?" for kind in FIELDS)
+        return [row[0] for row in self.conn.execute(query, [cutoff] * len(FIELDS))]
+
+    def size(self):
+        return sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+
+    def settings_with(self, keys):
+        """Settings of the users that set any of ``keys``, filtered inside SQLite."""
+        where = " OR ".join("json_extract(settings, ?) IS NOT NULL" for _ in keys)
+        rows = self.conn.execute(f"SELECT user_id, settings FROM users WHERE {where}", [f"$.{key}" for key in keys])
+        return {user_id: json.loads(settings) for user_id, settings in rows}
+
+    def load_user(self, user_id):
+        user_id = str(user_id)
+        row = self.conn.execute("SELECT settings FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        user_data = {"settings": json.loads(row[0])}
+        for kind, fields in FIELDS.items():
+            rows = self.conn.execute(
+                f"SELECT {', '.join(fields)} FROM {kind} WHERE user_id = ? ORDER BY id", (user_id,)
+            )
+            user_data[kind] = [dict(zip(fields, r)) for r in rows]
+        rows = self.conn.execute(
+            f"SELECT {', '.join(DAY_FIELDS)} FROM days WHERE user_id = ? ORDER BY date", (user_id,)
+        )
+        user_data["days"] = [dict(zip(DAY_FIELDS, r)) for r in rows]
+        rows = self.conn.execute(
+            f"SELECT {', '.join(ARCHIVE_FIELDS)} FROM archives WHERE user_id = ? ORDER BY segment", (user_id,)
+        )
+        user_data["archive"] = [dict(zip(ARCHIVE_FIELDS, r[:-1]), foods=json.loads(r[-1])) for r in rows]
+        return user_data
+
+    def _ensure_user(self, user_id, settings=None):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO users (user_id, settings) VALUES (?, ?)",
+            (user_id, json.dumps(settings or DEFAULT_SETTINGS, ensure_ascii=False))
+        )
+
+    def _insert(self, user_id, kind, records):
+        fields = FIELDS[kind]
+        self.conn.executemany(
+            f"INSERT INTO {kind} (user_id, {', '.join(fields)}) VALUES (?{', ?' * len(fields)})",
+            ((user_id, *(r.get(f, 0) for f in fields)) for r in records)
+        )
+
+    def _replace_user(self, user_id, user_data):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO users (user_id, settings) VALUES (?, ?)",
+            (user_id, json.dumps(user_data["settings"], ensure_ascii=False))
+        )
+        for kind in FIELDS:
+            self.conn.execute(f"DELETE FROM {kind} WHERE user_id = ?", (user_id,))
+            self._insert(user_id, kind, user_data.get(kind, []))
+        self.conn.execute("DELETE FROM days WHERE user_id = ?", (user_id,))
+        self.conn.execute("DELETE FROM archives WHERE user_id = ?", (user_id,))
+        self._summarize(user_id, user_data.get("days", []), user_data.get("archive", []))
+
+    def _summarize(self, user_id, days, segments):
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO days (user_id, {', '.join(DAY_FIELDS)}) VALUES (?{', ?' * len(DAY_FIELDS)})",
+            ((user_id, *(r[f] for f in DAY_FIELDS)) for r in days)
+        )
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO archives (user_id, {', '.join(ARCHIVE_FIELDS)}) VALUES (?{', ?' * len(ARCHIVE_FIELDS)})",
+            ((user_id, *(s[f] for f in ARCHIVE_FIELDS[:-1]), json.dumps(s["foods"], ensure_ascii=False)) for s in segments)
+        )
+
+    def _compact(self, user_id, cutoff, days, segment):
+        for kind in FIELDS:
+            self.conn.execute(f"DELETE FROM {kind} WHERE user_id = ? AND date < ?", (user_id, cutoff))
+        self._summarize(user_id, days, [segment])
+
+    def _set_settings(self, user_id, settings):
+        self.conn.execute(
+            "INSERT INTO users (user_id, settings) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET settings = excluded.settings",
+            (user_id, json.dumps(settings, ensure_ascii=False))
+        )
+
+    def write_batch(self, ops):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            for op, user_id, *args in ops:
+                user_id = str(user_id)
+                if op == "user":
+                    self._replace_user(user_id, args[0])
+                elif op == "append":
+                    self._ensure_user(user_id)
+                    self._insert(user_id, args[0], [args[1]])
+                elif op == "settings":
+                    self._set_settings(user_id, args[0])
+                elif op == "compact":
+                    self._ensure_user(user_id)
+                    self._compact(user_id, *args)
+
+    def extend(self, user_id, records, chunk=1000):
+        """Insert an iterable of ``(kind, record)`` pairs in one transaction, ``chunk`` rows at a time."""
+        user_id = str(user_id)
+        buffers = {kind: [] for kind in FIELDS}
+        count = 0
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self._ensure_user(user_id)
+            for kind, record in records:
+                buffers[kind].append(record)
+                count += 1
+                if len(buffers[kind]) >= chunk:
+                    self._insert(user_id, kind, buffers[kind])
+                    buffers[kind] = []
+            for kind, buffer in buffers.items():
+                self._insert(user_id, kind, buffer)
+        return count
+
+    def iter_records(self, user_id):
+        user_id = str(user_id)
+        for kind, fields in FIELDS.items():
+            rows = self.conn.execute(
+                f"SELECT {', '.join(fields)} FROM {kind} WHERE user_id = ? ORDER BY date, id", (user_id,)
+            )
+            for row in rows:
+                yield kind, dict(zip(fields, row))
+
+    def load_sessions(self, since):
+        sessions = new_sessions()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("DELETE FROM conversations WHERE updated < ?", (since,))
+            self.conn.execute("DELETE FROM user_state WHERE updated < ?", (since,))
+        for name, key, state in self.conn.execute("SELECT name, key, state FROM conversations"):
+            sessions["conversations"].setdefault(name, {})[tuple(json.loads(key))] = json.loads(state)
+        for user_id, data in self.conn.execute("SELECT user_id, data FROM user_state"):
+            sessions["user_data"][int(user_id)] = json.loads(data)
+        return sessions
+
+    def write_sessions(self, ops, now):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            for op, *args in ops:
+                if op == "conversation":
+                    name, key, state = args
+                    key = json.dumps(list(key))
+                    if state is None:
+                        self.conn.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, key))
+                    else:
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO conversations (name, key, state, updated) VALUES (?, ?, ?, ?)",
+                            (name, key, json.dumps(state), now)
+                        )
+                elif op == "user_data":
+                    user_id, data = args
+                    if data:
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO user_state (user_id, data, updated) VALUES (?, ?, ?)",
+                            (str(user_id), json.dumps(data, ensure_ascii=False), now)
+                        )
+                    else:
+                        self.conn.execute("DELETE FROM user_state WHERE user_id = ?", (str(user_id),))
+
+    def close(self):
+        self.conn.close()
+
+BACKENDS = {
+    "json": JsonStorage,
+    "sqlite": SqliteStorage,
+}
+
+def open_storage(backend, path):
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown storage backend: {backend}")
+    return BACKENDS[backend](path)
+
+def migrate_json(json_path, db_path):
+    """Build a new SQLite database from the JSON file.
+
+    All users go in one transaction into a temp file that is renamed to
+    ``db_path`` only once it is complete, so a failed run leaves no database
+    behind and the next start retries it instead of skipping users.
+    """
+    if os.path.exists(db_path):
+        raise FileExistsError(db_path)
+    tmp = db_path + ".migrating"
+    paths = (tmp, tmp + "-wal", tmp + "-shm")
+    for path in paths:
+        if os.path.exists(path):
+            os.unlink(path)
+    data = JsonStorage(json_path).load_all()
+    target = SqliteStorage(tmp)
+    try:
+        target.write_batch(("user", user_id, user_data) for user_id, user_data in data.items())
+    except BaseException:
+        target.close()
+        for path in paths:
+            if os.path.exists(path):
+                os.unlink(path)
+        raise
+    target.close()
+    os.replace(tmp, db_path)
+    fsync_dir(os.path.dirname(os.path.abspath(db_path)))
+    return len(data)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("שימוש: python storage.py fitness_data.json fitness_data.db")
+        sys.exit(1)
+    if os.path.exists(sys.argv[2]):
+        print(f"❌ {sys.argv[2]} כבר קיים")
+        sys.exit(1)
+    count = migrate_json(sys.argv[1], sys.argv[2])
+    print(f"✅ הועברו {count} משתמשים")
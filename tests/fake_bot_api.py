@@ -0,0 +1,98 @@
+"""
+🧪 שרת Bot API מדומה לבדיקות ולהרצה מקומית
+"""
+
+import argparse
+import asyncio
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+class FakeBotApi:
+    """A local stand-in for the Telegram Bot API.
+
+    Every call is recorded in ``calls`` as ``(monotonic time, method, params)``.
+    Sends and edits answer with a message echoing the text; ``respond`` queues
+    a one-off status and body for the next calls of a method, e.g. a 429 from
+    ``retry_after``. Point ``ExtBot(base_url=api.base_url)`` or the bot's
+    ``TELEGRAM_API_URL`` at it.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.calls = []
+        self.responses = defaultdict(deque)
+        self.runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/bot"
+
+    def respond(self, method, status, body):
+        self.responses[method].append((status, body))
+
+    def retry_after(self, method, seconds):
+        self.respond(method, 429, {
+            "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {seconds}",
+            "parameters": {"retry_after": seconds},
+        })
+
+    def error(self, method, description, code=400):
+        self.respond(method, code, {"ok": False, "error_code": code, "description": description})
+
+    def called(self, *methods):
+        return [call for call in self.calls if call[1] in methods]
+
+    def _result(self, method, params):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "fake", "username": "fake_bot"}
+        if method.startswith(("send", "edit")) and "chat_id" in params:
+            return {
+                "message_id": int(params.get("message_id", len(self.calls))), "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"}, "text": params.get("text", ""),
+            }
+        return True
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls.append((time.monotonic(), method, params))
+        if self.responses[method]:
+            status, body = self.responses[method].popleft()
+            return web.json_response(body, status=status)
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.port = self.runner.addresses[0][1]
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+async def _main(args):
+    api = await FakeBotApi(args.host, args.port).start()
+    print(f"🧪 Bot API מדומה ב-http://{args.host}:{api.port}")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await api.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="שרת Bot API מדומה (TELEGRAM_API_URL=http://127.0.0.1:8999)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,111 @@
+import json
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import bot
+from archive import ArchiveStore, Compactor
+from cache import AsyncUserStore, UserCache
+from storage import migrate_json, open_storage
+
+NOW = datetime(2024, 6, 1, 12, 0)
+TODAY = NOW.date()
+FOODS = ("טוסט", "סלט", "סלט עוף", "פסטה", "שייק")
+
+def legacy_user(seed=5, count=1500):
+    """A record in the pre-compaction JSON schema, without ``days`` or ``archive``, spanning two years."""
+    rng = random.Random(seed)
+    user_data = {"meals": [], "workouts": [], "weights": [], "settings": {"target_calories": 2000, "target_protein": 100}}
+    for _ in range(count):
+        when = (NOW - timedelta(minutes=rng.randint(0, 2 * 365 * 1440))).isoformat()
+        kind = rng.choice(("meals", "meals", "workouts", "weights"))
+        if kind == "meals":
+            record = {"name": rng.choice(FOODS), "calories": rng.randint(100, 1200), "protein": rng.randint(0, 60)}
+        elif kind == "workouts":
+            record = {"type": rng.choice(("ריצה", "יוגה")), "duration": rng.randint(5, 90)}
+        else:
+            record = {"value": round(rng.uniform(70, 80), 1)}
+        user_data[kind].append(dict(record, date=when))
+    for kind in ("meals", "workouts", "weights"):
+        user_data[kind].sort(key=lambda record: record["date"])
+    return user_data
+
+def open_store(tmp_path, backend):
+    """A store over a legacy ``fitness_data.json``, migrated first for SQLite."""
+    path = str(tmp_path / "fitness_data.json")
+    if backend == "sqlite":
+        db = str(tmp_path / "fitness_data.db")
+        if not (tmp_path / "fitness_data.db").exists():
+            migrate_json(path, db)
+        path = db
+    store = AsyncUserStore(UserCache(open_storage(backend, path), archive=ArchiveStore(str(tmp_path / "archive"))))
+    bot.storage = store
+    return store
+
+async def summaries(store, user_id):
+    user_data = await store.get(user_id)
+    aggregates = await store.aggregates(user_id)
+    foods = await store.foods(user_id)
+    week = aggregates.since(NOW - timedelta(days=7), end=NOW)
+    old_week = aggregates.since(NOW - timedelta(days=500), end=NOW - timedelta(days=494))
+    return {
+        "today": bot.today_text(user_data, aggregates, TODAY),
+        "days": [
+            (day.calories, day.protein, day.workout_minutes)
+            for day in (aggregates.day(TODAY - timedelta(days=back)) for back in range(0, 730, 7))
+        ],
+        "week": [
+            (window.calories, window.protein, window.meal_days, window.workout_count, window.workout_minutes)
+            for window in (week, old_week)
+        ],
+        "trend": [bot.trend_text(aggregates, today, 52) for today in (TODAY, TODAY - timedelta(days=400))],
+        "report": [
+            await bot.get_report(user_id, first, last, "x")
+            for first, last in (
+                (TODAY - timedelta(days=29), TODAY),
+                (TODAY - timedelta(days=600), TODAY - timedelta(days=300)),
+                (date(2020, 1, 1), TODAY),
+            )
+        ],
+        "weights": [bot.last_weight(user_data, back) for back in (1, 2, 3)],
+        "foods": [
+            [(food.name, food.calories, food.protein, food.count, food.last) for food in foods.search(prefix)]
+            for prefix in ("סל", "פ", "ש")
+        ] + [foods.get("טוסט").calories],
+    }
+
+@pytest.fixture(params=("sqlite", "json"))
+def backend(request, tmp_path):
+    with open(tmp_path / "fitness_data.json", "w", encoding="utf-8") as f:
+        json.dump({"1": legacy_user()}, f, ensure_ascii=False)
+    return request.param
+
+async def test_legacy_json_records_load_through_the_cache(tmp_path, backend):
+    store = open_store(tmp_path, backend)
+    user_data = await store.get(1)
+    assert len(user_data["days"]) == 0 and user_data["archive"] == []
+    await store.append(1, "weights", {"value": 75.0, "date": NOW.isoformat()})
+    await store.close()
+
+async def test_compaction_keeps_every_summary(tmp_path, backend):
+    store = open_store(tmp_path, backend)
+    compactor = Compactor(store, 365, clock=lambda: NOW)
+    before = await summaries(store, 1)
+
+    dry = await compactor.run(dry_run=True)
+    assert dry.users == 1 and dry.records
+    assert (await store.get(1))["archive"] == []
+
+    report = await compactor.run()
+    assert (report.users, report.records) == (1, dry.records)
+    user_data = await store.get(1)
+    assert user_data["meals"][0]["date"] >= compactor.cutoff().isoformat()
+    assert await summaries(store, 1) == before
+    await store.close()
+
+    store = open_store(tmp_path, backend)
+    assert len((await store.get(1))["archive"]) == 1
+    assert await summaries(store, 1) == before
+    assert (await Compactor(store, 365, clock=lambda: NOW).run()).users == 0
+    await store.close()
@@ -0,0 +1,106 @@
+import asyncio
+import contextlib
+import time
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import ExtBot
+
+from fake_bot_api import FakeBotApi
+from ratelimit import BULK, OutboundLimiter
+
+@contextlib.asynccontextmanager
+async def limited_bot(**limits):
+    """An ExtBot paced by an ``OutboundLimiter`` against a fake Bot API, as ``(api, bot, limiter)``."""
+    async with FakeBotApi() as api:
+        limiter = OutboundLimiter(**limits)
+        bot = ExtBot("1:fake", base_url=api.base_url, rate_limiter=limiter)
+        await bot.initialize()
+        try:
+            yield api, bot, limiter
+        finally:
+            await bot.shutdown()
+
+def texts(api, *methods):
+    return [params["text"] for _, _, params in api.called(*methods)]
+
+async def test_interactive_sends_go_ahead_of_bulk():
+    async with limited_bot(global_rate=10) as (api, bot, limiter):
+        order = []
+
+        async def send(text):
+            order.append(text)
+
+        def request(text, chat_id, lane=None):
+            return limiter.process_request(send, (text,), {}, "sendMessage", {"chat_id": chat_id}, lane)
+
+        bulk = [asyncio.create_task(request(f"bulk{i}", 1000 + i, BULK)) for i in range(13)]
+        await asyncio.sleep(0)
+        assert limiter.stats()["outbound_waiting_bulk"] == 3
+        interactive = [asyncio.create_task(request(f"interactive{i}", 2000 + i)) for i in range(3)]
+        await asyncio.gather(*bulk, *interactive)
+        assert order == (
+            [f"bulk{i}" for i in range(10)] + [f"interactive{i}" for i in range(3)] + [f"bulk{i}" for i in range(10, 13)]
+        )
+
+async def test_retry_after_pauses_and_retries():
+    async with limited_bot(global_rate=30) as (api, bot, limiter):
+        api.retry_after("sendMessage", 1)
+        started = time.monotonic()
+        message = await bot.send_message(1, "hello")
+        assert message.text == "hello"
+        first, second = api.called("sendMessage")
+        assert second[0] - first[0] >= 0.9
+        assert time.monotonic() - started >= 0.9
+        assert limiter.retries == 1
+
+async def test_retry_after_gives_up_after_max_retries():
+    async with limited_bot(global_rate=30, max_retries=0) as (api, bot, limiter):
+        api.retry_after("sendMessage", 1)
+        with pytest.raises(RetryAfter):
+            await bot.send_message(1, "hello")
+        assert len(api.called("sendMessage")) == 1
+
+async def test_rapid_edits_coalesce_into_the_latest():
+    async with limited_bot(global_rate=30, chat_rate=5, chat_burst=1) as (api, bot, limiter):
+        edits = [asyncio.create_task(bot.edit_message_text(f"v{i}", chat_id=1, message_id=7)) for i in range(5)]
+        results = await asyncio.gather(*edits)
+        assert texts(api, "editMessageText") == ["v0", "v4"]
+        assert [message.text for message in results] == ["v0"] + ["v4"] * 4
+        assert limiter.coalesced == 3
+        assert not limiter.edits
+
+async def test_edit_errors_reach_coalesced_waiters():
+    async with limited_bot(global_rate=30, chat_rate=5, chat_burst=1) as (api, bot, limiter):
+        await bot.send_message(1, "burst")
+        api.error("editMessageText", "Bad Request: message is not modified")
+        edits = [asyncio.create_task(bot.edit_message_text(f"v{i}", chat_id=1, message_id=7)) for i in range(3)]
+        results = await asyncio.gather(*edits, return_exceptions=True)
+        assert all(isinstance(result, BadRequest) for result in results)
+        assert texts(api, "editMessageText") == ["v2"]
+        assert not limiter.edits
+
+async def test_cancelling_a_waiting_edit_cancels_coalesced_waiters():
+    async with limited_bot(global_rate=30, chat_rate=5, chat_burst=1) as (api, bot, limiter):
+        await bot.send_message(1, "burst")
+        owner = asyncio.create_task(bot.edit_message_text("v0", chat_id=1, message_id=7))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(bot.edit_message_text("v1", chat_id=1, message_id=7))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        results = await asyncio.gather(owner, follower, return_exceptions=True)
+        assert all(isinstance(result, asyncio.CancelledError) for result in results)
+        assert not api.called("editMessageText")
+        assert not limiter.edits
+        message = await bot.edit_message_text("v2", chat_id=1, message_id=7)
+        assert message.text == "v2"
+
+async def test_per_chat_burst_then_chat_rate():
+    async with limited_bot(global_rate=30, chat_rate=5, chat_burst=3) as (api, bot, limiter):
+        started = time.monotonic()
+        await asyncio.gather(*(bot.send_message(1, f"m{i}") for i in range(5)), bot.send_message(2, "other"))
+        times = {params["text"]: at - started for at, _, params in api.called("sendMessage")}
+        assert max(times[f"m{i}"] for i in range(3)) < times["m3"]
+        assert times["other"] < times["m3"]
+        assert times["m3"] >= 0.15
+        assert times["m4"] >= 0.35
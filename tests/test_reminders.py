@@ -0,0 +1,130 @@
+import contextlib
+from datetime import datetime
+
+import pytest
+from telegram.error import Forbidden, RetryAfter
+
+from cache import AsyncUserStore, UserCache
+from reminders import ReminderScheduler
+from storage import open_storage
+from texts import catalog
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class FakeBot:
+    def __init__(self, blocked=(), retry_after=None):
+        self.blocked = set(blocked)
+        self.retry_after = retry_after or {}
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+        if self.retry_after.get(chat_id):
+            raise RetryAfter(self.retry_after.pop(chat_id))
+        self.sent.append((chat_id, text))
+
+@contextlib.asynccontextmanager
+async def scheduler_env(tmp_path):
+    """A scheduler on a fresh store with a fake clock and sleep, as ``(store, scheduler, clock, slept)``."""
+    store = AsyncUserStore(UserCache(open_storage("sqlite", str(tmp_path / "test.db"))))
+    clock = FakeClock(datetime(2024, 5, 1, 13, 58))
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    scheduler = ReminderScheduler(
+        store, lambda user_data, aggregates, day: f"digest {day}", catalog(), clock=clock, sleep=sleep
+    )
+    try:
+        yield store, scheduler, clock, slept
+    finally:
+        await scheduler.stop()
+        await store.close()
+
+def test_bucket_size_must_divide_the_day():
+    with pytest.raises(ValueError):
+        ReminderScheduler(None, None, None, bucket_minutes=7)
+    assert ReminderScheduler(None, None, None, bucket_minutes=8).buckets_per_day == 180
+
+async def test_subscriptions_round_down_to_their_bucket(tmp_path):
+    async with scheduler_env(tmp_path) as (store, scheduler, clock, slept):
+        assert await scheduler.subscribe(1, "lunch", 14 * 60 + 4) == "14:00"
+        assert scheduler.scheduled(1, "lunch") == 14 * 60
+        assert (await store.get(1))["settings"]["lunch_reminder"] == "14:00"
+        assert await scheduler.tick() == 0
+        clock.now = datetime(2024, 5, 1, 14, 0, 5)
+        assert await scheduler.tick() == 1
+        clock.now = datetime(2024, 5, 1, 14, 5)
+        assert await scheduler.tick() == 0
+
+        await store.flush()
+        reloaded = ReminderScheduler(store, None, None)
+        assert await reloaded.load() == 1
+        assert reloaded.subscriptions == scheduler.subscriptions
+
+async def test_late_tick_catches_up_on_a_few_buckets(tmp_path):
+    async with scheduler_env(tmp_path) as (store, scheduler, clock, slept):
+        for user_id, minutes in ((1, 14 * 60 + 30), (2, 20 * 60 + 55), (3, 21 * 60 + 5)):
+            await scheduler.subscribe(user_id, "digest", minutes)
+        clock.now = datetime(2024, 5, 1, 14, 0)
+        await scheduler.tick()
+        clock.now = datetime(2024, 5, 1, 21, 9)
+        assert await scheduler.tick() == 2
+        assert sorted(scheduler.queue.get_nowait()[0] for _ in range(2)) == ["2", "3"]
+
+async def test_catch_up_wraps_around_midnight(tmp_path):
+    async with scheduler_env(tmp_path) as (store, scheduler, clock, slept):
+        await scheduler.subscribe(1, "digest", 0)
+        clock.now = datetime(2024, 5, 1, 23, 55)
+        await scheduler.tick()
+        clock.now = datetime(2024, 5, 2, 0, 6)
+        assert await scheduler.tick() == 1
+
+async def test_lunch_reminder_skips_users_who_logged_lunch(tmp_path):
+    async with scheduler_env(tmp_path) as (store, scheduler, clock, slept):
+        await store.append(1, "meals", {"name": "סלט", "calories": 400, "protein": 30, "date": "2024-05-01T12:00:00"})
+        await store.append(2, "meals", {"name": "טוסט", "calories": 300, "protein": 12, "date": "2024-05-01T09:00:00"})
+        await store.append(2, "meals", {"name": "פסטה", "calories": 600, "protein": 25, "date": "2024-05-02T13:00:00"})
+        for user_id in (1, 2):
+            await scheduler.subscribe(user_id, "lunch", 14 * 60)
+        bot = FakeBot()
+        scheduler.start(bot)
+        clock.now = datetime(2024, 5, 1, 14, 0)
+        await scheduler.tick()
+        await scheduler.drain()
+        assert bot.sent == [(2, catalog().lunch_reminder)]
+        assert (scheduler.sent, scheduler.skipped) == (1, 1)
+
+async def test_retry_after_pauses_and_resends(tmp_path):
+    async with scheduler_env(tmp_path) as (store, scheduler, clock, slept):
+        await scheduler.subscribe(1, "digest", 14 * 60)
+        bot = FakeBot(retry_after={1: 3})
+        scheduler.start(bot)
+        clock.now = datetime(2024, 5, 1, 14, 0)
+        await scheduler.tick()
+        await scheduler.drain()
+        assert bot.sent == [(1, "digest 2024-05-01")]
+        assert slept[0] == 3
+        assert scheduler.failed == 0
+
+async def test_forbidden_unsubscribes_every_kind(tmp_path):
+    async with scheduler_env(tmp_path) as (store, scheduler, clock, slept):
+        await scheduler.subscribe(1, "digest", 14 * 60)
+        await scheduler.subscribe(1, "lunch", 20 * 60)
+        await scheduler.subscribe(2, "digest", 14 * 60)
+        bot = FakeBot(blocked={1})
+        scheduler.start(bot)
+        clock.now = datetime(2024, 5, 1, 14, 0)
+        await scheduler.tick()
+        await scheduler.drain()
+        assert bot.sent == [(2, "digest 2024-05-01")]
+        assert scheduler.scheduled(1, "digest") is None and scheduler.scheduled(1, "lunch") is None
+        settings = (await store.get(1))["settings"]
+        assert "digest_time" not in settings and "lunch_reminder" not in settings
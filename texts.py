@@ -0,0 +1,321 @@
+"""
+🗣️ טקסטים, תבניות ומקלדות מוכנים מראש לכל שפה
+"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+DEFAULT_LANGUAGE = "he"
+BAR_WIDTH = 10
+CALLBACK_DATA_LIMIT = 64
+
+HE = {
+    "buttons": {
+        "meal": "🍽️ הוסף ארוחה",
+        "workout": "💪 הוסף אימון",
+        "weight": "⚖️ עדכן משקל",
+        "today": "📊 סיכום יומי",
+        "week": "📈 סיכום שבועי",
+        "settings": "⚙️ הגדרות",
+    },
+    "menu": (("meal", "workout"), ("weight", "today"), ("week", "settings")),
+    "shortcuts": {
+        "meal": ("ארוחה:", "אכלתי"),
+        "workout": ("אימון:", "התאמנתי"),
+        "weight": ("משקל:",),
+    },
+    "quick_meals": (
+        ("☕", "בוקר", 350, 15),
+        ("🥗", "סלט עוף", 450, 40),
+        ("🥤", "שייק חלבון", 250, 30),
+        ("🥪", "סנדוויץ'", 400, 20),
+        ("🍝", "צהריים", 600, 35),
+        ("🍽️", "ערב", 500, 30),
+    ),
+    "quick_meal_button": "{icon} {name} - {calories} קל'",
+    "manual_meal_button": "✏️ הזנה ידנית",
+    "food_matches": "🔎 *מהמאכלים שלך:*\n\nבחר או המשך עם שם חדש",
+    "food_button": "{name} - {calories} קל' | {protein}g",
+    "new_food_button": "➕ {name} (חדש)",
+    "workouts": (
+        ("🏃", "ריצה"), ("🚶", "הליכה"),
+        ("🏋️", "חדר כושר"), ("🚴", "אופניים"),
+        ("🏀", "כדורסל"), ("⚽", "כדורגל"),
+        ("🏊", "שחייה"), ("🧘", "יוגה"),
+    ),
+    "workout_button": "{icon} {name}",
+    "custom_workout_button": "✏️ אחר",
+    "start": (
+        "🏋️ *ברוך הבא לבוט מעקב תזונה וכושר!*\n\n"
+        "אני אעזור לך לעקוב אחרי:\n"
+        "• 🍽️ ארוחות וקלוריות\n"
+        "• 💪 אימונים\n"
+        "• ⚖️ משקל\n\n"
+        "בחר אפשרות מהתפריט!"
+    ),
+    "help": (
+        "📖 *פקודות:*\n\n"
+        "/meal - הוסף ארוחה\n"
+        "/workout - הוסף אימון\n"
+        "/weight - עדכן משקל\n"
+        "/today - סיכום יומי\n"
+        "/week - סיכום שבועי\n"
+        "/month - סיכום חודשי\n"
+        "/trend - מגמה שבועית לאורך זמן\n"
+        "/report 01/01/2024 31/03/2024 - סיכום לתקופה\n"
+        "/digest 21:00 - סיכום יומי אוטומטי\n"
+        "/remind 14:00 - תזכורת לארוחת צהריים\n"
+        "/import - ייבוא היסטוריה (CSV/JSONL/JSON)\n"
+        "/export - ייצוא היסטוריה\n\n"
+        "*קיצורים:*\n"
+        "`ארוחה: שם, קלוריות, חלבון`\n"
+        "`ארוחה: שם` - מאכל שכבר רשמת\n"
+        "`אימון: סוג, דקות`\n"
+        "`משקל: 75.5`"
+    ),
+    "meal_menu": "🍽️ *הוספת ארוחה*\n\nבחר או הזן ידנית:",
+    "workout_menu": "💪 *הוספת אימון*\n\nבחר סוג:",
+    "today": (
+        "📊 *סיכום יומי - {date:%d/%m}*\n\n"
+        "🔥 *קלוריות:* {calories}/{target_calories}\n[{calories_bar}] {calories_pct}%\n\n"
+        "💪 *חלבון:* {protein}g/{target_protein}g\n[{protein_bar}] {protein_pct}%\n\n"
+        "🏃 *אימון:* {workout_minutes} דקות\n\n"
+        "🍽️ *ארוחות:*\n{meals}\n\n"
+        "💪 *אימונים:*\n{workouts}"
+    ),
+    "meal_line": "  • {name} - {calories} קל'",
+    "workout_line": "  • {type} - {duration} דק'",
+    "empty_list": "  אין",
+    "week": (
+        "📈 *סיכום שבועי*\n\n"
+        "🔥 *קלוריות:* {calories:,} (ממוצע: {avg_calories:,}/יום)\n"
+        "💪 *חלבון:* {protein}g\n\n"
+        "🏃 *אימונים:* {workout_count} ({workout_minutes} דק')\n"
+        "📅 *ימים פעילים:* {workout_days}/7"
+        "{weight_change}"
+    ),
+    "weight_change": "\n\n⚖️ *שינוי משקל:* {trend} {diff:+.1f} ק\"ג",
+    "trend": ("📉", "➡️", "📈"),
+    "report": (
+        "📅 *{title}* ({first:%d/%m/%Y} - {last:%d/%m/%Y})\n\n"
+        "🔥 *קלוריות:* {calories:,} (ממוצע: {avg_calories:,}/יום)\n"
+        "💪 *חלבון:* {protein:,}g (ממוצע: {avg_protein}g/יום)\n"
+        "📝 *ימים מתועדים:* {meal_days}/{days}\n\n"
+        "🎯 *ימים ביעד קלוריות:* {calorie_days}/{meal_days}\n"
+        "🎯 *ימים ביעד חלבון:* {protein_days}/{meal_days}\n\n"
+        "🏃 *אימונים:* {workout_count} ({workout_minutes} דק') ב-{workout_days} ימים"
+        "{workout_types}"
+        "{weight_change}"
+    ),
+    "month_title": "סיכום חודשי",
+    "range_title": "סיכום לתקופה",
+    "workout_type_line": "  • {type} - {count} ({minutes} דק')",
+    "weight_trend": "\n\n⚖️ *מגמת משקל (ממוצע {window} ימים):* {trend} {diff:+.1f} ק\"ג, כעת {current:.1f}",
+    "trend_report": "📉 *מגמה - {weeks} שבועות*\n\n_שבוע: קלוריות ליום | אימון | משקל ממוצע_\n{lines}{weight_change}",
+    "trend_line": "  • {start:%d/%m}: {avg_calories:,} קל' | {workout_minutes} דק' | {weight}",
+    "no_weight": "—",
+    "report_usage": "שימוש: /report 90 (ימים אחרונים) או /report 01/01/2024 31/03/2024",
+    "lunch_reminder": "🍽️ *עוד לא רשמת ארוחת צהריים היום*\n\nשלח /meal כדי להוסיף",
+    "digest_usage": "שימוש: /digest 21:00 או /digest off",
+    "digest_enabled": "✅ סיכום יומי יישלח כל יום ב-{}",
+    "digest_disabled": "🔕 הסיכום היומי בוטל",
+    "lunch_usage": "שימוש: /remind 14:00 או /remind off",
+    "lunch_enabled": "✅ אזכיר לך ב-{} אם לא רשמת ארוחת צהריים",
+    "lunch_disabled": "🔕 תזכורת הצהריים בוטלה",
+    "reminder_current": "\n\nכרגע: {}",
+    "meal_name_prompt": "✏️ הקלד את שם הארוחה:",
+    "calories_prompt": "🔥 כמה קלוריות?",
+    "protein_prompt": "💪 כמה גרם חלבון? (או 0)",
+    "number_only": "❌ מספר בלבד",
+    "meal_logged": "✅ *נרשם: {name}*\n🔥 {calories} קל' | 💪 {protein}g\n\n📊 היום: {total}/{target} קל' ({pct}%)",
+    "workout_type_prompt": "✏️ הקלד סוג אימון:",
+    "workout_duration_prompt": "⏱️ כמה דקות {type}?",
+    "duration_prompt": "⏱️ כמה דקות?",
+    "workout_logged": "✅ *נרשם: {type}*\n⏱️ {duration} דקות\n\n📊 השבוע: {week_minutes} דקות",
+    "weight_prompt": "⚖️ *עדכון משקל*{last}\n\nהקלד משקל:",
+    "last_weight": "\n📌 אחרון: {value} ק\"ג",
+    "weight_number_only": "❌ מספר בלבד (לדוגמה: 75.5)",
+    "weight_logged": "✅ *משקל: {value} ק\"ג*{change}",
+    "weight_diff": "\n{trend} שינוי: {diff:+.1f} ק\"ג",
+    "settings": (
+        "⚙️ *הגדרות*\n\n"
+        "🎯 יעד קלוריות: {target_calories}\n"
+        "💪 יעד חלבון: {target_protein}g\n"
+        "🌙 סיכום יומי: {digest}\n"
+        "⏰ תזכורת צהריים: {lunch}\n\n"
+        "לשינוי:\n/setcalories 2000\n/setprotein 150\n/digest 21:00\n/remind 14:00"
+    ),
+    "off": "כבוי",
+    "calories_set": "✅ יעד קלוריות: {}",
+    "calories_usage": "שימוש: /setcalories 2000",
+    "protein_set": "✅ יעד חלבון: {}g",
+    "protein_usage": "שימוש: /setprotein 150",
+    "meal_shortcut_logged": "✅ {name}\n🔥 {calories} קל' | 💪 {protein}g",
+    "meal_shortcut_usage": "פורמט: ארוחה: שם, קלוריות, חלבון",
+    "workout_shortcut_logged": "✅ {type}\n⏱️ {duration} דקות",
+    "workout_shortcut_usage": "פורמט: אימון: סוג, דקות",
+    "weight_shortcut_logged": "✅ משקל: {value} ק\"ג",
+    "weight_shortcut_usage": "פורמט: משקל: 75.5",
+    "import_start": (
+        "📥 *ייבוא היסטוריה*\n\n"
+        "שלח קובץ CSV, JSONL או מערך JSON עם השדות:\n"
+        "`kind,date,name,calories,protein,type,duration,value`\n\n"
+        "kind: meal / workout / weight\n"
+        "date: 2024-01-31T13:00\n\n"
+        "הקובץ מ-/export מתאים לייבוא. /cancel לביטול"
+    ),
+    "import_formats": "❌ רק קבצי csv, jsonl או json",
+    "importing": "⏳ מייבא...",
+    "import_done": (
+        "✅ יובאו {imported:,} רשומות\n"
+        "🍽️ {meals:,} ארוחות | 💪 {workouts:,} אימונים | ⚖️ {weights:,} שקילות{errors}"
+    ),
+    "import_errors": "\n\n⚠️ {failed:,} שורות נדחו:{lines}",
+    "import_error_line": "\n  • שורה {line}: {reason}",
+    "export_usage": "שימוש: /export csv, /export jsonl או /export json",
+    "export_empty": "📭 אין נתונים לייצוא",
+    "export_caption": "📤 {count:,} רשומות",
+    "cancelled": "❌ בוטל",
+}
+
+LANGUAGES = {"he": HE}
+
+class Catalog:
+    """One language's texts, with keyboards built and templates bound once at import.
+
+    PTB markup objects are frozen after construction, so the same instances are
+    shared by every reply. Templates are plain ``str.format`` strings whose bound
+    ``format`` methods are stored, and progress bars are precomputed per 10%
+    bucket, so rendering a summary only fills in the numbers.
+    """
+
+    def __init__(self, texts):
+        self.buttons = dict(texts["buttons"])
+        self.shortcuts = {kind: tuple(prefixes) for kind, prefixes in texts["shortcuts"].items()}
+        self.main_keyboard = ReplyKeyboardMarkup(
+            [[self.buttons[action] for action in row] for row in texts["menu"]],
+            resize_keyboard=True
+        )
+        meal_button = texts["quick_meal_button"].format
+        self.meal_keyboard = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(meal_button(icon=icon, name=name, calories=calories),
+                                   callback_data=f"quick_meal_{name}_{calories}_{protein}")]
+             for icon, name, calories, protein in texts["quick_meals"]]
+            + [[InlineKeyboardButton(texts["manual_meal_button"], callback_data="manual_meal")]]
+        )
+        workout_button = texts["workout_button"].format
+        workout_buttons = [
+            InlineKeyboardButton(workout_button(icon=icon, name=name), callback_data=f"workout_{name}")
+            for icon, name in texts["workouts"]
+        ]
+        self.workout_keyboard = InlineKeyboardMarkup(
+            [workout_buttons[i:i + 2] for i in range(0, len(workout_buttons), 2)]
+            + [[InlineKeyboardButton(texts["custom_workout_button"], callback_data="workout_custom")]]
+        )
+        self.food_button = texts["food_button"].format
+        self.new_food_button = texts["new_food_button"].format
+        self.food_matches = texts["food_matches"]
+        self.bars = tuple("█" * i + "░" * (BAR_WIDTH - i) for i in range(BAR_WIDTH + 1))
+        self.start = texts["start"]
+        self.help = texts["help"]
+        self.meal_menu = texts["meal_menu"]
+        self.workout_menu = texts["workout_menu"]
+        self.empty_list = texts["empty_list"]
+        self.trend = texts["trend"]
+        self.lunch_reminder = texts["lunch_reminder"]
+        self.reminder_usage = {kind: texts[f"{kind}_usage"] for kind in ("digest", "lunch")}
+        self.reminder_enabled = {kind: texts[f"{kind}_enabled"].format for kind in ("digest", "lunch")}
+        self.reminder_disabled = {kind: texts[f"{kind}_disabled"] for kind in ("digest", "lunch")}
+        self.reminder_current = texts["reminder_current"].format
+        self.meal_line = texts["meal_line"].format_map
+        self.workout_line = texts["workout_line"].format_map
+        self.today = texts["today"].format
+        self.week = texts["week"].format
+        self.weight_change = texts["weight_change"].format
+        self.report = texts["report"].format
+        self.month_title = texts["month_title"]
+        self.range_title = texts["range_title"]
+        self.workout_type_line = texts["workout_type_line"].format
+        self.weight_trend = texts["weight_trend"].format
+        self.trend_report = texts["trend_report"].format
+        self.trend_line = texts["trend_line"].format
+        self.no_weight = texts["no_weight"]
+        self.report_usage = texts["report_usage"]
+        self.meal_name_prompt = texts["meal_name_prompt"]
+        self.calories_prompt = texts["calories_prompt"]
+        self.protein_prompt = texts["protein_prompt"]
+        self.number_only = texts["number_only"]
+        self.meal_logged = texts["meal_logged"].format
+        self.workout_type_prompt = texts["workout_type_prompt"]
+        self.workout_duration_prompt = texts["workout_duration_prompt"].format
+        self.duration_prompt = texts["duration_prompt"]
+        self.workout_logged = texts["workout_logged"].format
+        self.weight_prompt = texts["weight_prompt"].format
+        self.last_weight = texts["last_weight"].format
+        self.weight_number_only = texts["weight_number_only"]
+        self.weight_logged = texts["weight_logged"].format
+        self.weight_diff = texts["weight_diff"].format
+        self.settings = texts["settings"].format
+        self.off = texts["off"]
+        self.calories_set = texts["calories_set"].format
+        self.calories_usage = texts["calories_usage"]
+        self.protein_set = texts["protein_set"].format
+        self.protein_usage = texts["protein_usage"]
+        self.meal_shortcut_logged = texts["meal_shortcut_logged"].format
+        self.meal_shortcut_usage = texts["meal_shortcut_usage"]
+        self.workout_shortcut_logged = texts["workout_shortcut_logged"].format
+        self.workout_shortcut_usage = texts["workout_shortcut_usage"]
+        self.weight_shortcut_logged = texts["weight_shortcut_logged"].format
+        self.weight_shortcut_usage = texts["weight_shortcut_usage"]
+        self.import_start = texts["import_start"]
+        self.import_formats = texts["import_formats"]
+        self.importing = texts["importing"]
+        self.import_done = texts["import_done"].format
+        self.import_errors = texts["import_errors"].format
+        self.import_error_line = texts["import_error_line"].format
+        self.export_usage = texts["export_usage"]
+        self.export_empty = texts["export_empty"]
+        self.export_caption = texts["export_caption"].format
+        self.cancelled = texts["cancelled"]
+
+    def food_keyboard(self, foods, name):
+        rows = []
+        for food in foods:
+            data = f"quick_meal_{food.name}_{food.calories}_{food.protein}"
+            if len(data.encode()) <= CALLBACK_DATA_LIMIT:
+                label = self.food_button(name=food.name, calories=food.calories, protein=food.protein)
+                rows.append([InlineKeyboardButton(label, callback_data=data)])
+        if not rows:
+            return None
+        rows.append([InlineKeyboardButton(self.new_food_button(name=name), callback_data="new_meal")])
+        return InlineKeyboardMarkup(rows)
+
+    def bar(self, pct):
+        return self.bars[min(BAR_WIDTH, max(0, pct * BAR_WIDTH // 100))]
+
+    def lines(self, line, records):
+        return "\n".join([line(record) for record in records]) or self.empty_list
+
+    def arrow(self, diff):
+        return self.trend[(diff > 0) - (diff < 0) + 1]
+
+    def change(self, diff):
+        return self.weight_change(trend=self.arrow(diff), diff=diff)
+
+    def trend_change(self, averages, window):
+        """Weight-trend line from a moving-average series, empty with fewer than two points."""
+        if len(averages) < 2:
+            return ""
+        diff = averages[-1][1] - averages[0][1]
+        return self.weight_trend(trend=self.arrow(diff), diff=diff,
+                                 current=averages[-1][1], window=window)
+
+CATALOGS = {}
+
+def catalog(language=DEFAULT_LANGUAGE):
+    """Return the prebuilt ``Catalog`` for ``language``, falling back to the default language."""
+    if language not in LANGUAGES:
+        language = DEFAULT_LANGUAGE
+    texts = CATALOGS.get(language)
+    if texts is None:
+        texts = CATALOGS[language] = Catalog(LANGUAGES[language])
+    return texts
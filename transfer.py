@@ -0,0 +1,165 @@
+"""
+📥 ייבוא וייצוא של היסטוריית המשתמש (CSV / JSONL / JSON)
+"""
+
+import csv
+import json
+import os
+from datetime import datetime
+
+KINDS = {"meal": "meals", "workout": "workouts", "weight": "weights"}
+NAMES = {kind: name for name, kind in KINDS.items()}
+CSV_FIELDS = ("kind", "date", "name", "calories", "protein", "type", "duration", "value")
+FORMATS = ("csv", "jsonl", "json")
+MAX_ERRORS = 5
+CHUNK_SIZE = 1 << 16
+
+class ImportReport:
+    __slots__ = ("counts", "errors", "failed")
+
+    def __init__(self):
+        self.counts = {kind: 0 for kind in KINDS.values()}
+        self.errors = []
+        self.failed = 0
+
+    @property
+    def imported(self):
+        return sum(self.counts.values())
+
+    def error(self, line, reason):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, reason))
+
+def detect_format(file_name):
+    extension = os.path.splitext(file_name or "")[1].lower().lstrip(".")
+    return extension if extension in FORMATS else None
+
+def _date(value):
+    when = datetime.fromisoformat(str(value).strip())
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    return when.isoformat()
+
+def _text(value):
+    value = str(value or "").strip()
+    if not value:
+        raise ValueError("empty")
+    return value
+
+def parse_row(row):
+    kind = KINDS.get(str(row.get("kind") or "").strip().lower())
+    if kind is None:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+    date = _date(row["date"])
+    if kind == "meals":
+        record = {
+            "name": _text(row.get("name")),
+            "calories": int(row["calories"]),
+            "protein": int(row.get("protein") or 0),
+            "date": date
+        }
+    elif kind == "workouts":
+        record = {"type": _text(row.get("type")), "duration": int(row["duration"]), "date": date}
+    else:
+        record = {"value": float(str(row["value"]).replace(",", ".")), "date": date}
+    return kind, record
+
+def _json_array(f, chunk_size=CHUNK_SIZE):
+    """Yield ``(index, item)`` for each element of a top-level JSON array, decoding ``f`` chunk by chunk."""
+    decoder = json.JSONDecoder()
+    buffer, pos = "", 0
+
+    def peek():
+        nonlocal buffer, pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            buffer, pos = f.read(chunk_size), 0
+            if not buffer:
+                raise ValueError("unexpected end of file")
+
+    if peek() != "[":
+        raise ValueError("expected a JSON array")
+    pos += 1
+    if peek() == "]":
+        return
+    index = 0
+    while True:
+        peek()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+            if end is not None and end < len(buffer):
+                break
+            more = f.read(chunk_size)
+            if not more:
+                if end is None:
+                    raise ValueError(f"invalid JSON in item {index + 1}")
+                break
+            buffer, pos = buffer[pos:] + more, 0
+        index += 1
+        pos = end
+        yield index, item
+        separator = peek()
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"expected ',' or ']' after item {index}")
+
+def _rows(path, fmt):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if fmt == "csv":
+            yield from enumerate(csv.DictReader(f), start=2)
+            return
+        if fmt == "json":
+            array = f.read(CHUNK_SIZE).lstrip().startswith("[")
+            f.seek(0)
+            if array:
+                yield from _json_array(f)
+                return
+        for line, text in enumerate(f, start=1):
+            if text.strip():
+                yield line, text
+
+def read_records(path, fmt, report):
+    """Yield validated ``(kind, record)`` pairs one row at a time; bad rows go to ``report``."""
+    try:
+        for line, row in _rows(path, fmt):
+            try:
+                if isinstance(row, str):
+                    row = json.loads(row)
+                kind, record = parse_row(row)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                report.error(line, str(e) or type(e).__name__)
+                continue
+            report.counts[kind] += 1
+            yield kind, record
+    except (csv.Error, ValueError) as e:
+        report.error("?", str(e))
+
+def write_records(records, path, fmt):
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, CSV_FIELDS) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        elif fmt == "json":
+            f.write("[")
+        for kind, record in records:
+            row = {"kind": NAMES[kind], **record}
+            if writer:
+                writer.writerow(row)
+            elif fmt == "json":
+                f.write((",\n" if count else "\n") + json.dumps(row, ensure_ascii=False))
+            else:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+        if fmt == "json":
+            f.write("\n]\n")
+    return count
@@ -0,0 +1,124 @@
+"""
+🌐 מצב webhook עם שרת aiohttp מובנה
+"""
+
+import asyncio
+import hmac
+import signal
+import threading
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, CommandHandler, ConversationHandler, MessageHandler
+
+from metrics import format_profile, profile_handlers, render_prometheus
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+MAX_PROFILE_SECONDS = 300
+
+UPDATE_TYPES = {
+    CommandHandler: Update.MESSAGE,
+    MessageHandler: Update.MESSAGE,
+    CallbackQueryHandler: Update.CALLBACK_QUERY,
+}
+
+def _handler_update_types(handler):
+    if isinstance(handler, ConversationHandler):
+        nested = handler.entry_points + handler.fallbacks
+        for handlers in handler.states.values():
+            nested += handlers
+        return {t for h in nested for t in _handler_update_types(h)}
+    for handler_type, update_type in UPDATE_TYPES.items():
+        if isinstance(handler, handler_type):
+            return {update_type}
+    return set(Update.ALL_TYPES)
+
+def allowed_updates(app):
+    """Update types the registered handlers consume; unknown handler types fall back to all."""
+    types = set()
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            types |= _handler_update_types(handler)
+    return sorted(types)
+
+def add_metrics_routes(server, stats=None):
+    """``GET /metrics`` in Prometheus text format and ``GET /debug/profile?seconds=N`` for a handler profile."""
+    profiling = asyncio.Lock()
+
+    async def metrics(request):
+        return web.Response(text=render_prometheus(stats() if stats else {}), content_type="text/plain")
+
+    async def profile(request):
+        try:
+            seconds = min(max(float(request.query.get("seconds", "10")), 0.1), MAX_PROFILE_SECONDS)
+        except ValueError:
+            return web.Response(status=400)
+        if profiling.locked():
+            return web.Response(status=409, text="profile already running")
+        async with profiling:
+            samples = await asyncio.to_thread(profile_handlers, threading.get_ident(), seconds)
+        return web.Response(text=format_profile(samples), content_type="text/plain")
+
+    server.router.add_get("/metrics", metrics)
+    server.router.add_get("/debug/profile", profile)
+    return server
+
+async def serve_metrics(host, port, stats=None):
+    """Metrics and profiling on their own listener, kept off the public webhook port; returns the runner to clean up."""
+    runner = web.AppRunner(add_metrics_routes(web.Application(), stats))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+def build_server(app, path, secret=None):
+    async def receive(request):
+        if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            update = Update.de_json(data, app.bot)
+        except (ValueError, TypeError, AttributeError, KeyError):
+            return web.Response(status=400)
+        if update is None:
+            return web.Response(status=400)
+        await app.update_queue.put(update)
+        return web.Response()
+
+    async def health(request):
+        return web.json_response({"status": "ok", "update_queue": app.update_queue.qsize()})
+
+    server = web.Application()
+    server.router.add_post(path, receive)
+    server.router.add_get("/health", health)
+    return server
+
+async def run_webhook(app, host, port, path, url=None, secret=None):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    if url:
+        await app.bot.set_webhook(
+            url=url.rstrip("/") + path,
+            secret_token=secret,
+            allowed_updates=allowed_updates(app)
+        )
+    await app.start()
+
+    runner = web.AppRunner(build_server(app, path, secret))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)